@@ -41,10 +41,10 @@ class ImagesAdmin(admin.ModelAdmin):
 
 @admin.register(ImportFile)
 class ImportFileAdmin(admin.ModelAdmin):
-    list_filter = ['uploaded']
+    list_filter = ['uploaded', 'status', 'mode']
     search_fields = ['description']
-    list_display = ['id', 'created', 'modified', 'description', 'file', 'uploaded']
-    readonly_fields = ('created', 'modified')
+    list_display = ['id', 'created', 'modified', 'description', 'file', 'uploaded', 'status', 'rows_processed', 'rows_failed']
+    readonly_fields = ('created', 'modified', 'status', 'rows_read', 'rows_processed', 'rows_skipped', 'rows_failed', 'images_failed', 'errors', 'started_at', 'finished_at')
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
@@ -0,0 +1,296 @@
+import gzip
+import hashlib
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ALL_ORGANIZATIONS = '*'
+# Objetos sin organización (compartidos): invalidan a todas las organizaciones
+SHARED = 'shared'
+
+# Codificaciones soportadas, por orden de preferencia ante el mismo q
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def generation_key(tag, organization=None):
+    return f'catalogue:generation:{tag}:{organization or ALL_ORGANIZATIONS}'
+
+
+def modified_key(tag, organization=None):
+    return f'catalogue:modified:{tag}:{organization or ALL_ORGANIZATIONS}'
+
+
+def new_generation():
+    # Basado en el tiempo para que una clave desalojada no reutilice un valor anterior
+    return int(time.time() * 1000)
+
+
+def get_catalogue_version(tags, organization=None):
+    """
+    Generación actual y fecha de última modificación de cada etiqueta para
+    la organización indicada (o para todas). Las respuestas en caché y los
+    ETag se derivan de estos valores, por lo que incrementarlos las invalida
+    sin borrar nada ni serializar.
+    """
+    generation_keys = [generation_key(tag, organization) for tag in tags]
+    modified_keys = [modified_key(tag, organization) for tag in tags]
+    if organization is not None:
+        # Las respuestas de una organización también incluyen objetos compartidos
+        generation_keys += [generation_key(tag, SHARED) for tag in tags]
+        modified_keys += [modified_key(tag, SHARED) for tag in tags]
+    values = cache.get_many(generation_keys + modified_keys)
+    missing = {key: new_generation() for key in generation_keys if key not in values}
+    missing.update({key: time.time() for key in modified_keys if key not in values})
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    generations = [values[key] for key in generation_keys]
+    last_modified = max(values[key] for key in modified_keys)
+    return generations, last_modified
+
+
+def bump_generation(tag, organization=None):
+    """
+    Invalida las respuestas que dependen de `tag` para la organización del
+    objeto modificado y las que no filtran por organización. Sin
+    organización (objeto compartido) se invalidan las de todas.
+    Dentro de una transacción se aplica al confirmarla (fuera de una, en el
+    acto): si la generación cambiara antes, una lectura concurrente vería la
+    nueva generación con las filas anteriores y las guardaría bajo ella, y
+    esa entrada seguiría vigente hasta la siguiente escritura.
+    """
+    transaction.on_commit(lambda: apply_generation_bump(tag, organization))
+
+
+def apply_generation_bump(tag, organization=None):
+    now = time.time()
+    for organization in {None, organization or SHARED}:
+        key = generation_key(tag, organization)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), None)
+        cache.set(modified_key(tag, organization), now, None)
+
+
+def request_fingerprint(view, request):
+    """
+    Huella de la petición (ruta, parámetros, host, Accept y versión del
+    catálogo) y fecha de última modificación. Se calcula una sola vez por
+    petición aunque la usen varios mixins.
+    """
+    if getattr(request, '_catalogue_fingerprint', None) is None:
+        organization = request.GET.get('organization') or None
+        params = sorted((key, request.GET.getlist(key)) for key in request.GET)
+        generations, last_modified = get_catalogue_version(view.cache_tags, organization)
+        raw = repr((
+            request.path,
+            params,
+            request.get_host(),
+            request.scheme,
+            request.META.get('HTTP_ACCEPT', ''),
+            generations,
+        ))
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        request._catalogue_fingerprint = (digest, last_modified)
+    return request._catalogue_fingerprint
+
+
+def parse_accept_encoding(header):
+    """
+    Codificaciones de Accept-Encoding con su valor q (1 si no se indica)
+    """
+    preferences = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences[coding] = quality
+    return preferences
+
+
+def get_content_encoding(view, request):
+    """
+    Codificación con la que se responde a la petición (None sin comprimir)
+    si la vista comprime sus respuestas (`compress_response`). Se negocia
+    una sola vez por petición aunque la usen varios mixins.
+    """
+    if not getattr(view, 'compress_response', False):
+        return None
+    if not hasattr(request, '_catalogue_encoding'):
+        preferences = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding, best = None, 0
+        for name in CONTENT_ENCODINGS:
+            quality = preferences.get(name, preferences.get('*', 0))
+            if quality > best:
+                encoding, best = name, quality
+        request._catalogue_encoding = encoding
+    return request._catalogue_encoding
+
+
+def compress(content, encoding):
+    # Se comprime una vez por entrada de caché, se usa el nivel máximo razonable
+    if encoding == 'br':
+        return brotli.compress(content, quality=9)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Comprime en streaming un iterable de str o bytes (exportaciones). Solo
+    se emite un bloque cuando el compresor tiene salida, por lo que la
+    memoria sigue siendo constante.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class ConditionalGetMixin:
+    """
+    ETag y Last-Modified derivados de la versión del catálogo (ver
+    get_catalogue_version). Un If-None-Match / If-Modified-Since vigente se
+    responde con 304 antes de consultar la base o serializar.
+    El ETag no se calcula a partir del contenido: solo es correcto si toda
+    escritura mueve la generación después de confirmarse (bump_generation
+    usa transaction.on_commit). Si la generación se moviera antes, un
+    cliente que revalidara en ese intervalo recibiría el ETag nuevo con el
+    contenido anterior y obtendría 304 sobre él hasta la siguiente escritura.
+    """
+    cache_tags = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not self.cache_tags:
+            return super().dispatch(request, *args, **kwargs)
+        digest, last_modified = request_fingerprint(self, request)
+        encoding = get_content_encoding(self, request)
+        # Cada codificación es una representación distinta con su propio ETag
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding') if getattr(self, 'compress_response', False) else ('Accept',))
+        # Los clientes deben revalidar siempre; la revalidación es casi gratuita
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class CachedResponseMixin:
+    """
+    Caché de lectura de respuestas JSON para vistas públicas del catálogo.
+
+    La clave es la huella de la petición (ver request_fingerprint), que
+    incluye las generaciones de `cache_tags` para la organización pedida
+    (?organization=). Las señales de los modelos incrementan esas
+    generaciones, por lo que no hace falta vaciar la caché.
+    Cada codificación negociada con Accept-Encoding (gzip y, si está
+    instalado brotli, br) se guarda ya comprimida en su propia clave: se
+    comprime una vez por entrada y los aciertos solo copian bytes.
+    Solo usar en vistas con permisos AllowAny: un acierto se responde sin
+    pasar por autenticación ni permisos.
+    """
+    cache_tags = ()
+    cache_timeout = None
+    cache_formats = ('json', 'msgpack')
+    compress_response = True
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        encoding = get_content_encoding(self, request)
+        if key is not None:
+            variant_key = self.get_variant_key(key, encoding)
+            entries = cache.get_many([key, variant_key])
+            entry = entries.get(variant_key)
+            if entry is None and key in entries:
+                # Otra codificación ya está en caché: se comprime sin volver a serializar
+                entry = self.compress_cache_entry(entries[key], encoding)
+                cache.set(variant_key, entry, self.get_cache_timeout())
+            if entry is not None:
+                return self.finalize_cached_response(self.build_cached_response(entry))
+        response = super().dispatch(request, *args, **kwargs)
+        if key is not None and self.is_cacheable(response):
+            response.render()
+            entry = self.build_cache_entry(response)
+            entries = {key: entry}
+            if encoding is not None:
+                entries[variant_key] = self.compress_cache_entry(entry, encoding)
+            cache.set_many(entries, self.get_cache_timeout())
+            if entries[variant_key] is not entry:
+                response = self.build_cached_response(entries[variant_key])
+        return self.finalize_cached_response(response)
+
+    def get_response_cache_key(self, request):
+        if request.method != 'GET' or not self.cache_tags:
+            return None
+        digest = request_fingerprint(self, request)[0]
+        return f'catalogue:response:{self.__class__.__name__}:{digest}'
+
+    def get_variant_key(self, key, encoding):
+        return f'{key}:{encoding}' if encoding else key
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is None:
+            return settings.CATALOGUE_CACHE_TIMEOUT
+        return self.cache_timeout
+
+    def is_cacheable(self, response):
+        renderer = getattr(response, 'accepted_renderer', None)
+        return response.status_code == 200 and renderer is not None and renderer.format in self.cache_formats
+
+    def build_cache_entry(self, response):
+        headers = {name: response[name] for name in ('Content-Type', 'Vary', 'Allow') if response.has_header(name)}
+        return {'content': response.content, 'headers': headers}
+
+    def compress_cache_entry(self, entry, encoding):
+        """
+        Variante comprimida de una entrada; las respuestas pequeñas se
+        guardan sin comprimir porque no compensa.
+        """
+        if encoding is None or len(entry['content']) < settings.CATALOGUE_COMPRESS_MIN_LENGTH:
+            return entry
+        headers = dict(entry['headers'], **{'Content-Encoding': encoding})
+        return {'content': compress(entry['content'], encoding), 'headers': headers}
+
+    def build_cached_response(self, entry):
+        response = HttpResponse(entry['content'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        return response
+
+    def finalize_cached_response(self, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
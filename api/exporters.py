@@ -0,0 +1,120 @@
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .importers import CATEGORY_SEPARATOR, META_FIELDS
+from .models import Product
+
+# Columnas del CSV; sku, name, brand, categories y meta_* usan el mismo
+# formato que la importación, por lo que el archivo se puede volver a importar
+CSV_COLUMNS = [
+    'id', 'sku', 'parent_sku', 'name', 'slug', 'state', 'currency', 'price_1', 'price_2',
+    'weight', 'length', 'width', 'height', 'manage_stock', 'stock_quantity', 'stock_status',
+    'brand', 'categories', 'image', 'images', 'description', 'short_description',
+    'meta_title', 'meta_description', 'meta_keywords', 'created', 'modified',
+]
+PRODUCT_FIELDS = [
+    'id', 'sku', 'name', 'slug', 'state', 'currency', 'price_1', 'price_2', 'weight', 'length',
+    'width', 'height', 'manage_stock', 'stock_quantity', 'stock_status', 'description',
+    'short_description', 'created', 'modified',
+]
+
+
+class Echo:
+    """
+    Objeto tipo archivo para csv.writer que devuelve la línea en vez de guardarla
+    """
+    def write(self, value):
+        return value
+
+
+class ProductExporter:
+    """
+    Exporta productos en streaming. El queryset se recorre con
+    iterator(chunk_size) (cursor de servidor en PostgreSQL) y las relaciones
+    se precargan por bloque, por lo que la memoria no depende del tamaño del
+    catálogo. Cada variación, a cualquier profundidad, se exporta como una
+    fila más tras su padre, con el sku del padre en `parent_sku`. Se
+    precargan `variations_depth` niveles; los más profundos se consultan
+    bajo demanda.
+    """
+    variations_depth = 2
+
+    def __init__(self, queryset, request=None, chunk_size=None):
+        self.queryset = queryset
+        self.request = request
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    def get_queryset(self):
+        return self.prefetch(self.queryset.prefetch_related(None).defer('search_vector', 'import_fingerprint'),
+                             self.variations_depth)
+
+    def prefetch(self, queryset, depth):
+        queryset = queryset.select_related('brand', 'metadata').prefetch_related('images', 'categories')
+        if depth > 0:
+            variations = self.prefetch(Product.objects.all(), depth - 1)
+            queryset = queryset.prefetch_related(Prefetch('variations', queryset=variations))
+        return queryset.order_by('id')
+
+    def get_rows(self):
+        for product in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield from self.get_product_rows(product)
+
+    def get_product_rows(self, product, parent=None, ancestors=frozenset()):
+        yield self.get_row(product, parent=parent)
+        ancestors = ancestors | {product.pk}
+        for variation in product.variations.all():
+            # Un ciclo en `parent` no debe repetir filas indefinidamente
+            if variation.pk not in ancestors:
+                yield from self.get_product_rows(variation, parent=product, ancestors=ancestors)
+
+    def get_url(self, image):
+        if not image:
+            return None
+        url = image.url
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+    def get_row(self, product, parent=None):
+        row = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        row['parent_sku'] = parent.sku if parent is not None else None
+        brand = product.brand
+        row['brand'] = {'id': brand.id, 'name': brand.name, 'slug': brand.slug} if brand else None
+        row['categories'] = [
+            {'id': category.id, 'name': category.name, 'slug': category.slug}
+            for category in product.categories.all()
+        ]
+        row['image'] = self.get_url(product.image)
+        row['images'] = [self.get_url(image.image) for image in product.images.all()]
+        try:
+            metadata = product.metadata
+        except Product.metadata.RelatedObjectDoesNotExist:
+            metadata = None
+        for field in META_FIELDS:
+            row[field] = getattr(metadata, field) if metadata is not None else None
+        return row
+
+    def iter_csv(self):
+        writer = csv.writer(Echo())
+        # La cabecera sale antes de consultar la base
+        yield writer.writerow(CSV_COLUMNS)
+        for row in self.get_rows():
+            row['brand'] = row['brand']['name'] if row['brand'] else None
+            row['categories'] = CATEGORY_SEPARATOR.join(category['name'] for category in row['categories'])
+            row['images'] = CATEGORY_SEPARATOR.join(url for url in row['images'] if url)
+            yield writer.writerow([self.format_csv_value(row[column]) for column in CSV_COLUMNS])
+
+    def format_csv_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def iter_ndjson(self):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        for row in self.get_rows():
+            yield encoder.encode(row) + '\n'
@@ -0,0 +1,40 @@
+"""
+Procesamiento de imágenes sin dependencias de Django, para poder
+ejecutarse en procesos hijos (ProcessPoolExecutor) sin configurar el ORM.
+"""
+import io
+
+from PIL import Image
+
+# Formatos que se guardan tal cual; el resto se convierte a JPEG o PNG
+KEEP_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+
+
+def process_image(data, max_size, quality=85):
+    """
+    Decodifica y valida la imagen y la reduce para que su lado mayor no
+    supere `max_size`. Devuelve (contenido, extensión). Si la imagen ya es
+    de un formato soportado y no hay que reducirla, se devuelve el original.
+    Lanza una excepción si el contenido no es una imagen válida.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        source_format = image.format
+        if source_format in KEEP_FORMATS and max(image.size) <= max_size:
+            return data, KEEP_FORMATS[source_format]
+
+        if max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        output_format = source_format if source_format in KEEP_FORMATS else None
+        if output_format in (None, 'GIF'):
+            output_format = 'PNG' if 'A' in image.getbands() or image.mode == 'P' else 'JPEG'
+        if output_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        buffer = io.BytesIO()
+        image.save(buffer, output_format, quality=quality, optimize=True)
+        return buffer.getvalue(), KEEP_FORMATS[output_format]
@@ -0,0 +1,894 @@
+import csv
+import io
+import itertools
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .cache import bump_generation
+from .imaging import process_image
+from .models import CURRENCY, OBJECT_STATUS, STOCK_STATUS, Brand, Category, Images, MetaData, Product, update_search_vector
+
+logger = logging.getLogger(__name__)
+
+# Columna del archivo -> campo de Product
+COLUMN_FIELDS = {
+    'name': 'name',
+    'description': 'description',
+    'short_description': 'short_description',
+    'currency': 'currency',
+    'price_1': 'price_1',
+    'price_2': 'price_2',
+    'weight': 'weight',
+    'length': 'length',
+    'width': 'width',
+    'height': 'height',
+    'manage_stock': 'manage_stock',
+    'stock_quantity': 'stock_quantity',
+    'stock_status': 'stock_status',
+    'state': 'state',
+    'brand': 'brand',
+}
+DECIMAL_FIELDS = ('price_1', 'price_2', 'weight', 'length', 'width', 'height')
+# Columnas que se guardan en MetaData
+META_FIELDS = ('meta_title', 'meta_description', 'meta_keywords')
+CATEGORY_SEPARATOR = '|'
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'si', 'sí', 'x')
+MAX_ERRORS = 1000
+# Intentos de un lote que choca con escrituras concurrentes (ver save_batch)
+SAVE_BATCH_ATTEMPTS = 3
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def normalize_header(value):
+    return '_'.join(str(value or '').strip().lower().split())
+
+
+def read_rows(file, name):
+    """
+    Generador de filas (dict) del archivo, sin cargarlo completo en memoria
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        return read_csv_rows(file)
+    if extension in ('.xlsx', '.xlsm'):
+        return read_xlsx_rows(file)
+    raise ImportFileError(f'Unsupported import file type: {extension or name}')
+
+
+def read_csv_rows(file):
+    stream = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    reader = csv.reader(itertools.chain([header], stream), delimiter=delimiter)
+    columns = [normalize_header(column) for column in next(reader, [])]
+    for values in reader:
+        if any(values):
+            yield dict(zip(columns, values))
+
+
+def read_xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('openpyxl is required to import .xlsx files')
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = [normalize_header(column) for column in next(rows, [])]
+        for values in rows:
+            if any(value not in (None, '') for value in values):
+                yield dict(zip(columns, values))
+    finally:
+        workbook.close()
+
+
+def clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_decimal(value):
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    value = clean(value)
+    if value is None:
+        return None
+    # Acepta "1.234,56" y "1,234.56"
+    if ',' in value and '.' in value:
+        thousands = '.' if value.rfind(',') > value.rfind('.') else ','
+        value = value.replace(thousands, '')
+    return Decimal(value.replace(',', '.'))
+
+
+def parse_decimal_column(row, column):
+    """
+    Valor decimal de la columna con la precisión del campo de Product
+    (None si está vacía). ValueError con la columna y el valor original si
+    no es un número finito o no cabe en el campo.
+    """
+    raw = row.get(column)
+    field = Product._meta.get_field(COLUMN_FIELDS[column])
+    try:
+        value = parse_decimal(raw)
+        if value is None:
+            return None
+        # Misma precisión que la columna para comparar con lo guardado
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite() or value.adjusted() >= field.max_digits - field.decimal_places:
+        raise ValueError(f'invalid {column} "{clean(raw)}"')
+    return value
+
+
+def parse_choice(value, choices):
+    value = clean(value)
+    if value is None:
+        return None
+    for key, label in choices:
+        if value.lower() == key.lower():
+            return key
+    raise ValueError(f'invalid value "{value}"')
+
+
+class ProductImporter:
+    """
+    Importa productos desde el archivo de un ImportFile por lotes:
+    - lee las filas en streaming (CSV o XLSX)
+    - hace upsert por `sku`: lee los existentes del lote, crea los nuevos con
+      bulk_create y actualiza los que cambiaron con bulk_update
+    - resuelve marcas y categorías contra diccionarios cargados una vez
+    - enlaza las categorías con un único bulk insert por lote
+
+    Solo se actualizan las columnas presentes en el archivo. Las categorías
+    se separan con "|" y se buscan por nombre dentro de la organización.
+
+    Cada producto guarda la huella (import_fingerprint) de los valores con
+    que se importó por última vez. Las filas cuya huella no cambió se omiten
+    sin escribir nada; en las demás solo se actualizan las columnas que
+    difieren del valor guardado. Los cambios hechos fuera de la importación
+    no alteran la huella, por lo que una fila igual a la anterior no los pisa.
+
+    Si otra importación crea uno de los sku (o slugs) entre la lectura y la
+    escritura, el insert falla por la restricción única y el lote se vuelve
+    a leer y a escribir (SAVE_BATCH_ATTEMPTS veces como máximo).
+
+    Cada lote guarda en el ImportFile, dentro de su misma transacción, el
+    progreso (rows_read, rows_processed, rows_failed, errors). Si el proceso
+    se interrumpe, una nueva ejecución salta las filas ya confirmadas y
+    continúa desde el último lote.
+    """
+
+    def __init__(self, import_file, batch_size=None):
+        self.import_file = import_file
+        self.organization = import_file.organization
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.columns = None
+        self.rows_read = import_file.rows_read
+        self.rows_processed = import_file.rows_processed
+        self.rows_skipped = import_file.rows_skipped
+        self.rows_failed = import_file.rows_failed
+        self.images_failed = import_file.images_failed
+        self.changed = False
+        self.errors = list(import_file.errors or [])
+
+    def run(self):
+        started = self.import_file.started_at or timezone.now()
+        self.update_import_file(status='processing', started_at=started, finished_at=None)
+        try:
+            self.load_lookups()
+            self.import_rows()
+            if self.import_file.images_zip:
+                # El zip se procesa completo en cada ejecución
+                self.images_failed = 0
+                ImageZipImporter(self.import_file, self.add_image_error).run()
+            if self.import_file.remove_all:
+                self.remove_missing()
+        except ImportFileError as ex:
+            self.fail(str(ex))
+            raise
+        except Exception:
+            self.fail()
+            raise
+        finally:
+            # Lo confirmado hasta aquí ya es visible en el catálogo
+            if self.changed:
+                bump_generation('product', self.organization_id)
+        self.update_import_file(status='done', finished_at=timezone.now(), uploaded=True, **self.get_progress())
+        logger.info('Import file %s: %s rows imported (%s unchanged), %s failed, %s images failed',
+                    self.import_file.pk, self.rows_processed, self.rows_skipped, self.rows_failed, self.images_failed)
+        return self
+
+    def import_rows(self):
+        """
+        Lee el archivo y guarda las filas por lotes. Un sku repetido en el
+        archivo se importa solo desde su primera fila válida; las siguientes
+        se informan como fallidas.
+        """
+        with self.import_file.file.open('rb') as file:
+            rows = enumerate(read_rows(file, self.import_file.file.name), start=2)
+            # Reanudación: las filas hasta el último punto de control ya están
+            # guardadas; solo se recuerdan sus sku
+            seen = {clean(row.get('sku')) for line, row in itertools.islice(rows, self.rows_read)}
+            batch = {}
+            for line, row in rows:
+                if self.columns is None:
+                    self.columns = set(row)
+                    self.fields = self.get_fields()
+                self.rows_read += 1
+                item = self.build_item(line, row)
+                if item is None:
+                    continue
+                sku = item[0].sku
+                if sku in seen:
+                    self.add_error(line, sku, 'duplicate sku in the file, only its first row is imported')
+                    continue
+                seen.add(sku)
+                batch[sku] = item
+                if len(batch) >= self.batch_size:
+                    self.save_batch(list(batch.values()))
+                    batch = {}
+            if batch or self.rows_read != self.import_file.rows_read:
+                self.save_batch(list(batch.values()))
+
+    def get_progress(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_processed': self.rows_processed,
+            'rows_skipped': self.rows_skipped,
+            'rows_failed': self.rows_failed,
+            'images_failed': self.images_failed,
+            'errors': list(self.errors),
+        }
+
+    def fail(self, message=None):
+        # El progreso guardado es el del último lote confirmado
+        errors = list(self.import_file.errors or [])
+        if message:
+            errors.append({'line': None, 'sku': None, 'error': message})
+        self.update_import_file(status='failed', finished_at=timezone.now(), errors=errors)
+
+    def update_import_file(self, **fields):
+        # update() en vez de save() para no disparar las señales de ImportFile
+        fields['modified'] = timezone.now()
+        type(self.import_file).objects.filter(pk=self.import_file.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self.import_file, name, value)
+
+    @property
+    def organization_id(self):
+        return self.organization.pk if self.organization else None
+
+    def load_lookups(self):
+        self.brands = {
+            name.lower(): pk for name, pk in
+            Brand.objects.filter(organization=self.organization).values_list('name', 'id')
+        }
+        self.categories = {
+            name.lower(): pk for name, pk in
+            Category.objects.filter(organization=self.organization).values_list('name', 'id')
+        }
+
+    def get_brand_id(self, name):
+        key = name.lower()
+        if key not in self.brands:
+            self.brands[key] = Brand.objects.create(name=name, organization=self.organization).pk
+        return self.brands[key]
+
+    def get_category_id(self, name):
+        key = name.lower()
+        if key not in self.categories:
+            self.categories[key] = Category.objects.create(name=name, organization=self.organization).pk
+        return self.categories[key]
+
+    def add_error(self, line, sku, message):
+        self.rows_failed += 1
+        self.append_error(line, sku, message)
+
+    def add_image_error(self, line, sku, message):
+        # Las imágenes no son filas: no cuentan en rows_failed
+        self.images_failed += 1
+        self.append_error(line, sku, message)
+
+    def append_error(self, line, sku, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'sku': sku, 'error': message})
+
+    def build_item(self, line, row):
+        """
+        Convierte una fila en (Product sin guardar, ids de categorías o None,
+        metadatos o None); None indica que el archivo no trae esas columnas
+        """
+        sku = clean(row.get('sku'))
+        name = clean(row.get('name'))
+        if not sku:
+            self.add_error(line, sku, 'sku is required')
+            return None
+        if not name:
+            self.add_error(line, sku, 'name is required')
+            return None
+        try:
+            product = Product(
+                sku=sku,
+                name=name,
+                organization=self.organization,
+                description=clean(row.get('description')),
+                short_description=clean(row.get('short_description')),
+                currency=parse_choice(row.get('currency'), CURRENCY) or self.import_file.currency,
+                manage_stock=str(row.get('manage_stock') or '').strip().lower() in TRUE_VALUES,
+                stock_status=parse_choice(row.get('stock_status'), STOCK_STATUS) or 'instock',
+                state=parse_choice(row.get('state'), OBJECT_STATUS) or 'publish',
+            )
+            for field in DECIMAL_FIELDS:
+                setattr(product, field, parse_decimal_column(row, field))
+            raw_quantity = clean(row.get('stock_quantity'))
+            try:
+                stock_quantity = int(parse_decimal(raw_quantity)) if raw_quantity is not None else 0
+            except (InvalidOperation, ValueError, OverflowError):
+                stock_quantity = None
+            # Rango de la columna entera
+            if stock_quantity is None or not -2 ** 31 <= stock_quantity < 2 ** 31:
+                raise ValueError(f'invalid stock_quantity "{raw_quantity}"')
+            product.stock_quantity = stock_quantity
+            brand = clean(row.get('brand'))
+            product.brand_id = self.get_brand_id(brand) if brand else None
+            category_ids = None
+            if 'categories' in row:
+                names = [clean(name) for name in str(row.get('categories') or '').split(CATEGORY_SEPARATOR)]
+                category_ids = {self.get_category_id(name) for name in names if name}
+        except (InvalidOperation, ValueError) as ex:
+            self.add_error(line, sku, str(ex) or 'invalid value')
+            return None
+        metadata = None
+        if any(field in row for field in META_FIELDS):
+            metadata = {field: clean(row.get(field)) for field in META_FIELDS if field in row}
+        product.import_fingerprint = self.get_fingerprint(product, category_ids, metadata)
+        return product, category_ids, metadata
+
+    def get_fields(self):
+        """
+        Campos de Product que importa el archivo según sus columnas
+        """
+        fields = {COLUMN_FIELDS[column] for column in self.columns if column in COLUMN_FIELDS}
+        if self.import_file.currency:
+            fields.add('currency')
+        return sorted(fields | {'name'})
+
+    def get_fingerprint(self, product, category_ids, metadata):
+        values = [(field, getattr(product, Product._meta.get_field(field).attname)) for field in self.fields]
+        if category_ids is not None:
+            values.append(('categories', sorted(category_ids)))
+        if metadata is not None:
+            values.append(('metadata', sorted(metadata.items())))
+        return hashlib.md5(repr(values).encode('utf-8')).hexdigest()
+
+    def save_batch(self, batch):
+        """
+        Crea los productos nuevos y actualiza los que cambiaron. Los cambios
+        se agrupan por conjunto de columnas modificadas para que cada
+        bulk_update escriba solo esas columnas.
+        """
+        for attempt in range(1, SAVE_BATCH_ATTEMPTS + 1):
+            try:
+                return self.write_batch(batch)
+            except IntegrityError:
+                # Un sku o slug creado por otra importación desde la lectura
+                if attempt == SAVE_BATCH_ATTEMPTS:
+                    raise
+                logger.warning('Import file %s: batch conflicted with a concurrent write, retrying', self.import_file.pk)
+
+    def write_batch(self, batch):
+        fields = [Product._meta.get_field(field) for field in self.fields]
+        existing = {
+            product.sku: product for product in Product.all_objects.filter(
+                sku__in=[product.sku for product, category_ids, metadata in batch],
+            ).only('id', 'sku', 'organization_id', 'is_removed', 'import_fingerprint', *self.fields)
+        }
+        now = timezone.now()
+        created, updated = [], []
+        skipped = 0
+        # Se registran tras las escrituras, para no repetirlos si se reintenta
+        errors = []
+        for product, category_ids, metadata in batch:
+            current = existing.get(product.sku)
+            if current is None:
+                created.append((product, category_ids, metadata))
+            elif current.organization_id != self.organization_id:
+                errors.append(product.sku)
+            elif current.import_fingerprint == product.import_fingerprint and not current.is_removed:
+                skipped += 1
+            else:
+                changed = [field.name for field in fields if getattr(current, field.attname) != getattr(product, field.attname)]
+                for name in changed:
+                    setattr(current, name, getattr(product, name))
+                if current.is_removed:
+                    current.is_removed = False
+                    changed.append('is_removed')
+                current.import_fingerprint = product.import_fingerprint
+                updated.append((current, changed, category_ids, metadata))
+
+        self.assign_slugs([product for product, category_ids, metadata in created])
+        with transaction.atomic():
+            touched = self.create_products(created)
+            touched += self.update_products(updated, now)
+            self.set_metadata([(product, metadata) for product, category_ids, metadata in created]
+                              + [(product, metadata) for product, changed, category_ids, metadata in updated])
+            if touched:
+                self.changed = True
+                update_search_vector(Product.all_objects.filter(pk__in=touched))
+            for sku in errors:
+                self.add_error(None, sku, 'sku belongs to another organization')
+            progress = self.get_progress()
+            progress['rows_processed'] += len(created) + len(updated) + skipped
+            progress['rows_skipped'] += skipped
+            self.update_import_file(**progress)
+        self.rows_processed += len(created) + len(updated) + skipped
+        self.rows_skipped += skipped
+
+    def assign_slugs(self, products):
+        """
+        Slugs únicos en la organización para los productos nuevos, incluso
+        si el archivo repite nombres
+        """
+        slugs = Product.get_unique_slugs(self.organization_id, [product.name for product in products])
+        for product, slug in zip(products, slugs):
+            product.slug = slug
+
+    def create_products(self, items):
+        if not items:
+            return []
+        Product.all_objects.bulk_create([product for product, category_ids, metadata in items])
+        if 'categories' in self.columns:
+            self.set_categories({product.pk: category_ids for product, category_ids, metadata in items})
+        return [product.pk for product, category_ids, metadata in items]
+
+    def update_products(self, items, now):
+        """
+        Actualiza solo las columnas que cambiaron; si únicamente cambió la
+        huella (p. ej. otras columnas en el archivo) se guarda solo la huella
+        """
+        categories = {}
+        if 'categories' in self.columns:
+            Through = Product.categories.through
+            current = {}
+            for product_id, category_id in Through.objects.filter(
+                    product_id__in=[product.pk for product, changed, category_ids, metadata in items],
+            ).values_list('product_id', 'category_id'):
+                current.setdefault(product_id, set()).add(category_id)
+            categories = {
+                product.pk: category_ids for product, changed, category_ids, metadata in items
+                if category_ids != current.get(product.pk, set())
+            }
+            self.set_categories(categories)
+
+        groups = {}
+        touched = []
+        for product, changed, category_ids, metadata in items:
+            if changed or product.pk in categories:
+                product.modified = now
+                changed = changed + ['modified']
+                touched.append(product.pk)
+            groups.setdefault(tuple(changed + ['import_fingerprint']), []).append(product)
+        for fields, products in groups.items():
+            Product.all_objects.bulk_update(products, fields)
+        return touched
+
+    def set_categories(self, categories):
+        """
+        Reemplaza las categorías de los productos indicados ({id: ids de categorías})
+        """
+        if not categories:
+            return
+        Through = Product.categories.through
+        Through.objects.filter(product_id__in=categories).delete()
+        Through.objects.bulk_create([
+            Through(product_id=product_id, category_id=category_id)
+            for product_id, category_ids in categories.items() for category_id in category_ids
+        ], ignore_conflicts=True)
+
+    def set_metadata(self, items):
+        """
+        Crea o actualiza MetaData de los productos ([(producto, metadatos)])
+        con las columnas de metadatos presentes en el archivo
+        """
+        fields = [field for field in META_FIELDS if field in self.columns]
+        if not fields:
+            return
+        MetaData.objects.bulk_create(
+            [MetaData(product_id=product.pk, **metadata) for product, metadata in items],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=fields,
+        )
+
+    def remove_missing(self):
+        """
+        Con `remove_all`, elimina (soft delete) los productos de la organización
+        cuyo sku no aparece en el archivo. Se vuelve a leer el archivo solo
+        para obtener los sku, así que también funciona al reanudar.
+        Si el archivo no trajo filas válidas o alguna fila falló no se elimina
+        nada (un archivo vacío, truncado o con errores dejaría sin catálogo a
+        la organización) y el motivo queda en `errors`.
+        """
+        if not self.rows_processed or self.rows_failed:
+            reason = f'{self.rows_failed} row(s) failed' if self.rows_failed else 'no valid rows in the file'
+            self.errors.append({'line': None, 'sku': None, 'error': f'remove_all skipped: {reason}'})
+            return
+        missing = set(Product.objects.filter(organization=self.organization, sku__isnull=False)
+                      .values_list('sku', flat=True).iterator())
+        with self.import_file.file.open('rb') as file:
+            for row in read_rows(file, self.import_file.file.name):
+                missing.discard(clean(row.get('sku')))
+        missing = list(missing)
+        now = timezone.now()
+        for start in range(0, len(missing), self.batch_size):
+            removed = Product.objects.filter(
+                organization=self.organization, sku__in=missing[start:start + self.batch_size],
+            ).update(is_removed=True, modified=now)
+            self.changed = self.changed or bool(removed)
+
+
+class CopyProductImporter(ProductImporter):
+    """
+    Modo COPY (solo PostgreSQL) para cargas masivas, p. ej. el alta de una
+    organización con millones de productos. Cada lote se copia con
+    COPY FROM STDIN a una tabla temporal y se integra con SQL por conjuntos:
+    - INSERT ... ON CONFLICT (sku) DO UPDATE en api_product, que solo
+      reescribe las filas cuya huella cambió
+    - reemplazo de las categorías de los productos escritos
+    - upsert de api_metadata
+
+    El parseo, las marcas/categorías, los puntos de control y remove_all
+    son los de ProductImporter.
+    """
+    staging_table = 'import_product_staging'
+    merged_table = 'import_product_merged'
+
+    def __init__(self, import_file, batch_size=None):
+        super().__init__(import_file, batch_size or settings.IMPORT_COPY_BATCH_SIZE)
+
+    def get_staging_fields(self):
+        """
+        Campos de Product que se copian a la tabla temporal
+        """
+        names = ['sku', 'name', 'slug', 'description', 'short_description', 'import_fingerprint']
+        names += [name for name in COLUMN_FIELDS.values() if name not in names]
+        return [Product._meta.get_field(name) for name in names]
+
+    def save_batch(self, batch):
+        # El slug de la tabla temporal solo se usa al insertar productos nuevos
+        existing = set(Product.all_objects.filter(
+            sku__in=[product.sku for product, category_ids, metadata in batch]).values_list('sku', flat=True))
+        self.assign_slugs([product for product, category_ids, metadata in batch if product.sku not in existing])
+        fields = self.get_staging_fields()
+        meta_fields = [MetaData._meta.get_field(name) for name in META_FIELDS]
+        columns = [field.column for field in fields] + ['category_ids'] + [field.column for field in meta_fields]
+        quote = connection.ops.quote_name
+
+        buffer = io.StringIO()
+        for product, category_ids, metadata in batch:
+            values = [field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields]
+            values.append(None if category_ids is None else '{%s}' % ','.join(map(str, sorted(category_ids))))
+            values += [(metadata or {}).get(field.name) for field in meta_fields]
+            buffer.write('\t'.join(copy_value(value) for value in values) + '\n')
+        buffer.seek(0)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            definitions = [f'{quote(field.column)} {field.db_type(connection)}' for field in fields]
+            definitions.append('category_ids bigint[]')
+            definitions += [f'{quote(field.column)} {field.db_type(connection)}' for field in meta_fields]
+            cursor.execute(f'CREATE TEMPORARY TABLE {self.staging_table} ({", ".join(definitions)}) ON COMMIT DROP')
+            cursor.execute(f'CREATE TEMPORARY TABLE {self.merged_table} (id bigint, sku varchar(250)) ON COMMIT DROP')
+            cursor.copy_expert(
+                f'COPY {self.staging_table} ({", ".join(map(quote, columns))}) FROM STDIN', buffer)
+
+            self.reject_foreign_skus(cursor)
+            self.merge_products(cursor, fields)
+            cursor.execute(f'SELECT count(*) FROM {self.merged_table}')
+            merged = cursor.fetchone()[0]
+            if 'categories' in self.columns:
+                self.merge_categories(cursor)
+            if any(field in self.columns for field in META_FIELDS):
+                self.merge_metadata(cursor, meta_fields)
+            if merged:
+                self.changed = True
+                update_search_vector(Product.all_objects.filter(
+                    pk__in=RawSQL(f'SELECT id FROM {self.merged_table}', [])))
+
+            processed = len(batch) - self.rejected
+            progress = self.get_progress()
+            progress['rows_processed'] += processed
+            progress['rows_skipped'] += processed - merged
+            self.update_import_file(**progress)
+            cursor.execute(f'DROP TABLE {self.staging_table}, {self.merged_table}')
+        self.rows_processed += processed
+        self.rows_skipped += processed - merged
+
+    def reject_foreign_skus(self, cursor):
+        product_table = Product._meta.db_table
+        cursor.execute(
+            f'DELETE FROM {self.staging_table} s USING {product_table} p '
+            f'WHERE p.sku = s.sku AND p.organization_id IS DISTINCT FROM %s RETURNING s.sku',
+            [self.organization_id])
+        skus = [sku for sku, in cursor.fetchall()]
+        for sku in skus:
+            self.add_error(None, sku, 'sku belongs to another organization')
+        self.rejected = len(skus)
+
+    def merge_products(self, cursor, fields):
+        """
+        Inserta los productos nuevos y actualiza las columnas del archivo en
+        los existentes cuya huella cambió (o estaban eliminados). Los ids
+        escritos quedan en la tabla temporal merged_table.
+        """
+        quote = connection.ops.quote_name
+        staged = {field.column for field in fields}
+        now = timezone.now()
+        columns, values, params = [], [], []
+        for field in Product._meta.concrete_fields:
+            if field.primary_key or field.name == 'search_vector':
+                continue
+            columns.append(quote(field.column))
+            if field.column in staged:
+                values.append(f's.{quote(field.column)}')
+            elif field.name in ('created', 'modified'):
+                values.append('%s')
+                params.append(now)
+            elif field.name == 'organization':
+                values.append('%s')
+                params.append(self.organization_id)
+            else:
+                values.append('%s')
+                params.append(field.get_db_prep_save(field.get_default(), connection))
+
+        updates = [Product._meta.get_field(name).column for name in self.fields]
+        assignments = [f'{quote(column)} = EXCLUDED.{quote(column)}' for column in updates + ['import_fingerprint']]
+        assignments += ['"is_removed" = false', '"modified" = EXCLUDED."modified"']
+        product_table = Product._meta.db_table
+        cursor.execute(
+            f'WITH merged AS ('
+            f'INSERT INTO {product_table} ({", ".join(columns)}) '
+            f'SELECT {", ".join(values)} FROM {self.staging_table} s '
+            f'ON CONFLICT ("sku") DO UPDATE SET {", ".join(assignments)} '
+            f'WHERE {product_table}."import_fingerprint" IS DISTINCT FROM EXCLUDED."import_fingerprint" '
+            f'OR {product_table}."is_removed" '
+            f'RETURNING "id", "sku") '
+            f'INSERT INTO {self.merged_table} (id, sku) SELECT id, sku FROM merged',
+            params)
+
+    def merge_categories(self, cursor):
+        through = Product.categories.through._meta.db_table
+        cursor.execute(f'DELETE FROM {through} WHERE product_id IN (SELECT id FROM {self.merged_table})')
+        cursor.execute(
+            f'INSERT INTO {through} (product_id, category_id) '
+            f'SELECT m.id, unnest(s.category_ids) FROM {self.staging_table} s '
+            f'JOIN {self.merged_table} m ON m.sku = s.sku WHERE s.category_ids IS NOT NULL '
+            f'ON CONFLICT DO NOTHING')
+
+    def merge_metadata(self, cursor, meta_fields):
+        quote = connection.ops.quote_name
+        columns = [quote(field.column) for field in meta_fields if field.name in self.columns]
+        table = MetaData._meta.db_table
+        cursor.execute(
+            f'INSERT INTO {table} (product_id, {", ".join(columns)}) '
+            f'SELECT m.id, {", ".join(f"s.{column}" for column in columns)} FROM {self.staging_table} s '
+            f'JOIN {self.merged_table} m ON m.sku = s.sku WHERE true '
+            f'ON CONFLICT (product_id) DO UPDATE SET '
+            f'{", ".join(f"{column} = EXCLUDED.{column}" for column in columns)}')
+
+
+def copy_value(value):
+    """
+    Valor en el formato de texto de COPY (\\N para NULL)
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def get_importer(import_file):
+    """
+    Importador según ImportFile.mode; el modo COPY requiere PostgreSQL y en
+    otras bases se usa el importador por lotes del ORM
+    """
+    if import_file.mode == 'copy':
+        if connection.vendor == 'postgresql':
+            return CopyProductImporter(import_file)
+        logger.warning('Import file %s: COPY mode requires PostgreSQL, using batched import', import_file.pk)
+    return ProductImporter(import_file)
+
+
+class ImageZipImporter:
+    """
+    Importa las imágenes del `images_zip` de un ImportFile:
+    - lee el zip miembro a miembro, sin extraerlo a disco
+    - deduplica por el sha256 del contenido original (Images.content_hash),
+      antes de decodificar: cada contenido se procesa y se escribe una vez
+    - decodifica, valida y reduce las imágenes nuevas en un pool de procesos
+      (de hilos dentro de un proceso daemon)
+    - asocia cada imagen por el nombre del archivo sin extensión: si coincide
+      con un Images.code se actualiza esa imagen; si coincide con un sku
+      (admite sufijos "_1", "-2"...) se agrega a las imágenes del producto
+      y pasa a ser su imagen principal si no tenía una
+    """
+    extensions = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+    sku_suffix = re.compile(r'^(.+?)[_\- ]\d{1,3}$')
+
+    def __init__(self, import_file, on_error, workers=None, batch_size=None):
+        self.import_file = import_file
+        self.organization = import_file.organization
+        self.on_error = on_error
+        self.workers = workers or settings.IMPORT_IMAGE_WORKERS
+        self.batch_size = batch_size or settings.IMPORT_IMAGE_BATCH_SIZE
+        self.max_size = settings.IMPORT_IMAGE_MAX_SIZE
+        self.max_bytes = settings.IMPORT_IMAGE_MAX_BYTES
+        # sha256 -> Images guardada con ese contenido
+        self.files = {
+            image.content_hash: image for image in
+            Images.objects.filter(organization=self.organization, content_hash__isnull=False)
+            .only('id', 'image', 'content_hash')
+        }
+        self.processing = set()
+        self.results = []
+        self.matches = []
+        self.images_linked = 0
+
+    def run(self):
+        executor = self.get_executor()
+        try:
+            with self.import_file.images_zip.open('rb') as file, zipfile.ZipFile(file) as archive:
+                self.read_archive(archive, executor)
+        except zipfile.BadZipFile as ex:
+            raise ImportFileError(f'Invalid images zip: {ex}')
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        bump_generation('images', self.import_file.organization_id)
+        return self
+
+    def get_executor(self):
+        if self.workers <= 1:
+            return None
+        # Los procesos daemon (p. ej. workers prefork de Celery) no pueden
+        # tener hijos: se usan hilos, PIL libera el GIL al decodificar y reducir
+        if multiprocessing.current_process().daemon:
+            return ThreadPoolExecutor(self.workers)
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def read_archive(self, archive, executor):
+        pending = {}
+        for info in archive.infolist():
+            name = info.filename
+            stem, extension = os.path.splitext(os.path.basename(name))
+            if info.is_dir() or stem.startswith('.') or '__MACOSX' in name or extension.lower() not in self.extensions:
+                continue
+            if info.file_size > self.max_bytes:
+                self.on_error(None, stem, f'{name}: image too large')
+                continue
+            data = archive.read(info)
+            digest = hashlib.sha256(data).hexdigest()
+            self.matches.append((stem, digest))
+            if digest not in self.files and digest not in self.processing:
+                self.processing.add(digest)
+                if executor is None:
+                    self.add_result(stem, digest, name, lambda: process_image(data, self.max_size))
+                else:
+                    # Limita los trabajos en vuelo para no cargar el zip completo en memoria
+                    if len(pending) >= self.workers * 4:
+                        self.collect(pending, FIRST_COMPLETED)
+                    pending[executor.submit(process_image, data, self.max_size)] = (stem, digest, name)
+            if len(self.matches) >= self.batch_size:
+                self.collect(pending, ALL_COMPLETED)
+                self.flush()
+        self.collect(pending, ALL_COMPLETED)
+        self.flush()
+
+    def collect(self, pending, return_when):
+        if not pending:
+            return
+        done, not_done = wait(pending, return_when=return_when)
+        for future in done:
+            stem, digest, name = pending.pop(future)
+            self.add_result(stem, digest, name, future.result)
+
+    def add_result(self, stem, digest, name, get_result):
+        try:
+            data, extension = get_result()
+        except Exception as ex:
+            self.on_error(None, stem, f'{name}: invalid image ({ex})')
+        else:
+            self.results.append((stem, digest, data, extension))
+
+    def flush(self):
+        results, matches = self.results, self.matches
+        self.results, self.matches = [], []
+        if not matches:
+            return
+        stems = {stem for stem, digest in matches}
+        codes = {
+            image.code: image for image in
+            Images.objects.filter(organization=self.organization, code__in=stems).only('id', 'code', 'image', 'content_hash')
+        }
+        now = timezone.now()
+        created, updated = [], {}
+
+        with transaction.atomic():
+            # Contenidos nuevos: se escriben una sola vez en el storage
+            for stem, digest, data, extension in results:
+                image = codes.get(stem) or Images(name=stem, code=stem, organization=self.organization)
+                image.content_hash = digest
+                image.image.save(f'{stem}{extension}', ContentFile(data), save=False)
+                if image.pk:
+                    image.modified = now
+                    updated[image.pk] = image
+                else:
+                    created.append(image)
+                self.files[digest] = image
+            Images.objects.bulk_create(created)
+            self.processing.difference_update(digest for stem, digest, data, extension in results)
+
+            links = {}
+            for stem, digest in matches:
+                source = self.files.get(digest)
+                if source is None:
+                    # No se pudo procesar; el error ya se registró
+                    continue
+                image = codes.get(stem, source)
+                if image.content_hash != digest:
+                    # Otra imagen con el mismo código: reutiliza el archivo ya guardado
+                    image.image = source.image.name
+                    image.content_hash = digest
+                    image.modified = now
+                    updated[image.pk] = image
+                links.setdefault(stem, image)
+            if updated:
+                Images.objects.bulk_update(list(updated.values()), ['image', 'content_hash', 'modified'])
+            self.link_products(links)
+
+    def link_products(self, links):
+        """
+        Agrega las imágenes a los productos cuyo sku coincide con el nombre
+        del archivo (o con el nombre sin el sufijo numérico)
+        """
+        candidates = {}
+        for stem, image in links.items():
+            candidates.setdefault(stem, []).append(image)
+            match = self.sku_suffix.match(stem)
+            if match:
+                candidates.setdefault(match.group(1), []).append(image)
+        products = Product.all_objects.filter(organization=self.organization, sku__in=candidates)
+        Through = Product.images.through
+        rows, main_images = [], {}
+        for pk, sku, current in products.values_list('id', 'sku', 'image'):
+            for image in candidates[sku]:
+                rows.append(Through(product_id=pk, images_id=image.pk))
+            if not current:
+                main_images[pk] = min(candidates[sku], key=lambda image: image.code or '').image.name
+        Through.objects.bulk_create(rows, ignore_conflicts=True)
+        if main_images:
+            Product.all_objects.filter(pk__in=main_images).update(
+                image=Case(*[When(pk=pk, then=Value(name)) for pk, name in main_images.items()]),
+                modified=timezone.now(),
+            )
+        self.images_linked += len(rows)
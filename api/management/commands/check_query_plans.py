@@ -0,0 +1,135 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from api.models import Product
+
+# Paso de ordenación explícito en el plan: el índice no da el orden pedido
+SORT_PATTERNS = {
+    'postgresql': re.compile(r'^\s*(->\s+)?(Incremental )?Sort(\s+\(|$)', re.MULTILINE),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (LAST \d+ TERMS OF |RIGHT PART OF )?ORDER BY'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Ejecuta los listados de productos, categorías, marcas y slides, y comprueba con EXPLAIN '
+            'que su consulta principal usa el índice esperado y no ordena las filas aparte. '
+            'En tablas con menos de --min-rows filas los problemas son avisos: con pocas filas '
+            'el planificador prefiere recorrer y ordenar la tabla')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Filas mínimas de una tabla para que un plan sin su índice sea un error')
+
+    def get_shapes(self):
+        """
+        (nombre, vista, acciones, parámetros, tabla, índice esperado). El
+        índice puede depender del motor ({vendor: índice}); None indica que
+        en ese motor ningún índice da ese orden.
+        """
+        # Valores con productos: si el COUNT da 0 la paginación no ejecuta el listado
+        products = Product.objects.filter(parent=None, virtual=False)
+        organization = products.exclude(organization=None).values_list('organization', flat=True).first() or 1
+        brand = products.exclude(brand=None).values_list('brand', flat=True).first() or 1
+        return [
+            ('product', views.ProductView, None, {}, 'api_product', 'api_product_root_created_idx'),
+            ('product ?ordering=name', views.ProductView, None, {'ordering': 'name'},
+             'api_product', 'api_product_root_name_idx'),
+            ('product ?ordering=-price_1', views.ProductView, None, {'ordering': '-price_1'},
+             'api_product', 'api_product_root_price_idx'),
+            ('product ?cursor=', views.ProductView, None, {'cursor': ''}, 'api_product', 'api_product_root_created_idx'),
+            ('product ?cursor=&ordering=name', views.ProductView, None, {'cursor': '', 'ordering': 'name'},
+             'api_product', 'api_product_root_name_idx'),
+            # El cursor ordena con NULLS LAST en ambos sentidos; en PostgreSQL el
+            # descendente necesita su propio índice (ver migración 0014)
+            ('product ?cursor=&ordering=price_1', views.ProductView, None, {'cursor': '', 'ordering': 'price_1'},
+             'api_product', 'api_product_root_price_idx'),
+            ('product ?cursor=&ordering=-price_1', views.ProductView, None, {'cursor': '', 'ordering': '-price_1'},
+             'api_product', {'postgresql': 'api_product_root_price_desc_idx', 'sqlite': 'api_product_root_price_idx'}),
+            ('product ?organization=', views.ProductView, None, {'organization': organization},
+             'api_product', 'api_product_root_org_idx'),
+            ('product ?brand__id=', views.ProductView, None, {'brand__id': brand},
+             'api_product', 'api_product_root_brand_idx'),
+            ('product_view', views.ProductViewSet, {'get': 'list'}, {}, 'api_product', 'api_product_root_name_idx'),
+            ('category', views.CategoryViewSet, {'get': 'list'}, {}, 'api_category', 'api_category_order_idx'),
+            ('category/tree', views.CategoryViewSet, {'get': 'tree'}, {}, 'api_category', 'api_category_order_idx'),
+            ('brand', views.BrandViewSet, {'get': 'list'}, {}, 'api_brand', 'api_brand_order_idx'),
+            ('slide', views.SlideViewSet, {'get': 'list'}, {}, 'api_slide', 'api_slide_order_idx'),
+        ]
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        if connection.vendor not in SORT_PATTERNS:
+            self.stdout.write(self.style.WARNING(f'SKIP  query plans cannot be checked on {connection.vendor}'))
+            return
+        failures = []
+        # Sin caché de respuestas y con cualquier host, para ejecutar siempre las consultas
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            with connection.cursor() as cursor:
+                # Estadísticas al día; se descartan junto con la transacción en SQLite
+                cursor.execute('ANALYZE')
+                if connection.vendor == 'postgresql':
+                    # Con tablas pequeñas el planificador prefiere recorrerlas enteras;
+                    # se desactiva para comprobar si el índice es aplicable
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, view_class, actions, params, table, index in self.get_shapes():
+                if isinstance(index, dict):
+                    index = index.get(connection.vendor)
+                    if index is None:
+                        self.stdout.write(self.style.WARNING(f'SKIP  {name}: no matching index on {connection.vendor}'))
+                        continue
+                sql = self.capture_query(view_class, actions, params, table)
+                if sql is None:
+                    self.stdout.write(self.style.WARNING(f'SKIP  {name}: no rows in {table}'))
+                    continue
+                plan = self.explain(sql)
+                problems = []
+                if index not in plan:
+                    problems.append(f'{index} not used')
+                if self.has_sort(plan):
+                    problems.append('rows sorted outside the index')
+                if problems and self.count_rows(table) < options['min_rows']:
+                    self.stdout.write(self.style.WARNING(f"WARN  {name}: {', '.join(problems)} (small table)"))
+                elif problems:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"FAIL  {name}: {', '.join(problems)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'OK    {name}: {index}'))
+                if verbosity > 1 or problems:
+                    self.stdout.write(f'      {sql}')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'      {line}')
+        if failures:
+            raise CommandError(f"{len(failures)} query shape(s) do not use their index: {', '.join(failures)}")
+
+    def count_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+
+    def has_sort(self, plan):
+        pattern = SORT_PATTERNS.get(connection.vendor)
+        return pattern is not None and pattern.search(plan) is not None
+
+    def capture_query(self, view_class, actions, params, table):
+        """
+        SQL de la primera consulta ordenada sobre `table` que ejecuta la vista
+        """
+        initkwargs = {'cache_tags': ()}
+        view = view_class.as_view(actions, **initkwargs) if actions else view_class.as_view(**initkwargs)
+        with CaptureQueriesContext(connection) as context:
+            view(APIRequestFactory().get('/', params))
+        for query in context.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT') and f'FROM "{table}"' in sql and 'ORDER BY' in sql:
+                return sql
+        return None
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exporters import ProductExporter
+from api.models import Organization, Product
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo de productos (con variaciones) en CSV o NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--organization', help='Slug de la organización')
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--chunk-size', type=int, help='Productos por bloque')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.filter(parent=None, virtual=False)
+        if options['organization']:
+            organization = Organization.objects.filter(slug=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' does not exist")
+            queryset = queryset.filter(organization=organization)
+
+        exporter = ProductExporter(queryset, chunk_size=options['chunk_size'])
+        rows = exporter.iter_csv() if options['format'] == 'csv' else exporter.iter_ndjson()
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for line in rows:
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
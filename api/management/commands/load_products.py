@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import CURRENCY, ImportFile, Organization
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga productos desde un archivo CSV/XLSX creando un ImportFile. '
+        'Por defecto usa el modo COPY (PostgreSQL); en otras bases se usa la importación por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv o .xlsx')
+        parser.add_argument('--organization', help='Slug de la organización')
+        parser.add_argument('--images-zip', help='Zip con imágenes de los productos')
+        parser.add_argument('--currency', choices=[key for key, label in CURRENCY])
+        parser.add_argument('--mode', choices=['copy', 'batch'], default='copy')
+        parser.add_argument('--remove-all', action='store_true',
+                            help='Elimina los productos de la organización que no estén en el archivo')
+
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(slug=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organization '{options['organization']}' does not exist")
+        for path in (options['path'], options['images_zip']):
+            if path and not os.path.isfile(path):
+                raise CommandError(f'File not found: {path}')
+
+        import_file = ImportFile(
+            organization=organization,
+            currency=options['currency'],
+            mode=options['mode'],
+            remove_all=options['remove_all'],
+            description=f'load_products {os.path.basename(options["path"])}',
+        )
+        with open(options['path'], 'rb') as file:
+            import_file.file.save(os.path.basename(options['path']), File(file), save=False)
+        if options['images_zip']:
+            with open(options['images_zip'], 'rb') as file:
+                import_file.images_zip.save(os.path.basename(options['images_zip']), File(file), save=False)
+        # handle_import_file encola la importación (en modo eager se ejecuta aquí)
+        import_file.save()
+        import_file.refresh_from_db()
+
+        if not settings.CELERY_TASK_ALWAYS_EAGER:
+            self.stdout.write(f'Import file {import_file.pk} queued')
+            return
+        self.stdout.write(
+            f'Import file {import_file.pk}: {import_file.status}, '
+            f'{import_file.rows_processed} rows processed ({import_file.rows_skipped} unchanged), '
+            f'{import_file.rows_failed} failed')
+        for error in import_file.errors[:20]:
+            self.stderr.write(f"  line {error['line']} sku {error['sku']}: {error['error']}")
+        if import_file.status == 'failed':
+            raise CommandError(f'Import file {import_file.pk} failed')
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('api', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(pk, seen=()):
+        if pk not in paths:
+            parent_id = parents.get(pk)
+            prefix = path_for(parent_id, seen + (pk,)) if parent_id and parent_id not in seen else ''
+            paths[pk] = f'{prefix}{pk}/'
+        return paths[pk]
+
+    categories = list(Category.objects.only('id'))
+    for category in categories:
+        category.path = path_for(category.id)
+    Category.objects.bulk_update(categories, ['path'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_slide'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='path'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='api_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
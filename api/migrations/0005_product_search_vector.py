@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:39
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# El índice GIN y el tsvector solo existen en PostgreSQL; en SQLite la
+# búsqueda sigue usando icontains.
+CREATE_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS api_product_search_vector_idx ON api_product USING gin (search_vector)'
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS api_product_search_vector_idx'
+BACKFILL_SQL = """
+UPDATE api_product p SET search_vector =
+    setweight(to_tsvector('spanish', coalesce(p.name, '')), 'A')
+    || setweight(to_tsvector('spanish', coalesce(p.sku, '')), 'B')
+    || setweight(to_tsvector('spanish',
+        coalesce((SELECT b.name FROM api_brand b WHERE b.id = p.brand_id), '') || ' ' ||
+        coalesce((SELECT string_agg(c.name, ' ') FROM api_category c
+                  INNER JOIN api_product_categories pc ON pc.category_id = c.id
+                  WHERE pc.product_id = p.id), '')), 'C')
+    || setweight(to_tsvector('spanish',
+        coalesce(p.short_description, '') || ' ' || coalesce(p.description, '')), 'D')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BACKFILL_SQL)
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='search vector'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
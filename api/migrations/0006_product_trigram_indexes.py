@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:40
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Índices de trigramas para /api/product/suggest/, solo en PostgreSQL.
+# Se indexa UPPER(...) porque istartswith compila a UPPER(col) LIKE UPPER(%s).
+CREATE_INDEXES_SQL = [
+    'CREATE INDEX IF NOT EXISTS api_product_name_trgm_idx ON api_product USING gin (UPPER(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS api_product_sku_trgm_idx ON api_product USING gin (UPPER(sku) gin_trgm_ops)',
+]
+DROP_INDEXES_SQL = [
+    'DROP INDEX IF EXISTS api_product_name_trgm_idx',
+    'DROP INDEX IF EXISTS api_product_sku_trgm_idx',
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+def mark_uploaded_done(apps, schema_editor):
+    ImportFile = apps.get_model('api', 'ImportFile')
+    ImportFile.objects.filter(uploaded=True).update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_product_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfile',
+            name='errors',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='errors'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='finished at'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='rows_failed',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rows failed'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rows processed'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rows read'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='started at'),
+        ),
+        migrations.AddField(
+            model_name='importfile',
+            name='status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='pending', editable=False, max_length=20, verbose_name='status'),
+        ),
+        migrations.RunPython(mark_uploaded_done, migrations.RunPython.noop),
+    ]
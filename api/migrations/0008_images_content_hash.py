@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_import_file_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='images',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='content hash'),
+        ),
+    ]
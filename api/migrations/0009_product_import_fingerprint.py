@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_images_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfile',
+            name='rows_skipped',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rows skipped'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='import_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, verbose_name='import fingerprint'),
+        ),
+    ]
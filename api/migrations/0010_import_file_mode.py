@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_product_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfile',
+            name='mode',
+            field=models.CharField(choices=[('batch', 'batch'), ('copy', 'copy (PostgreSQL)')], default='batch', max_length=20, verbose_name='mode'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_import_file_mode'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['organization', 'modified', 'id'], name='api_product_org_modified_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_product_changes_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='brand',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['order', 'name'], name='api_brand_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('virtual', False)), fields=['order', 'name'], name='api_category_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_removed', False), ('parent__isnull', True), ('virtual', False)), fields=['created', 'id'], name='api_product_root_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_removed', False), ('parent__isnull', True), ('virtual', False)), fields=['name', 'id'], name='api_product_root_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_removed', False), ('parent__isnull', True), ('virtual', False)), fields=['price_1', 'id'], name='api_product_root_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_removed', False), ('parent__isnull', True), ('virtual', False)), fields=['organization', 'created', 'id'], name='api_product_root_org_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_removed', False), ('parent__isnull', True), ('virtual', False)), fields=['brand', 'created', 'id'], name='api_product_root_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slide',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['order', 'name'], name='api_slide_order_idx'),
+        ),
+    ]
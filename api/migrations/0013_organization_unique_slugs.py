@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:08
+
+from django.db import migrations, models
+
+
+def deduplicate_slugs(apps, schema_editor):
+    """
+    Antes de crear las restricciones, renombra los slugs vacíos y los
+    repetidos dentro de una organización agregando el primer sufijo libre
+    ("mesa-2"); el registro más antiguo conserva el slug
+    """
+    for name in ('Category', 'Brand', 'Product'):
+        model = apps.get_model('api', name)
+        rows = list(model._base_manager.exclude(slug=None).order_by('id').values_list('id', 'organization_id', 'slug'))
+        taken = {(organization_id, slug) for pk, organization_id, slug in rows}
+        seen = set()
+        renamed = []
+        for pk, organization_id, slug in rows:
+            if slug and (organization_id, slug) not in seen:
+                seen.add((organization_id, slug))
+                continue
+            base = (slug or name.lower())[:245]
+            candidate, suffix = base, 2
+            while (organization_id, candidate) in taken:
+                candidate, suffix = f'{base}-{suffix}', suffix + 1
+            taken.add((organization_id, candidate))
+            seen.add((organization_id, candidate))
+            renamed.append(model(pk=pk, slug=candidate))
+        model._base_manager.bulk_update(renamed, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_root_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_slugs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='brand',
+            constraint=models.UniqueConstraint(fields=('slug', 'organization'), name='api_brand_slug_org_uniq', opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(fields=('slug', 'organization'), name='api_category_slug_org_uniq', opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('slug', 'organization'), name='api_product_slug_org_uniq', opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Paginación por cursor con ?ordering=-price_1: ORDER BY price_1 DESC NULLS LAST,
+# id DESC. En PostgreSQL (NULL mayor que todo) no coincide con ningún sentido de
+# recorrido de api_product_root_price_idx; en SQLite sí, por lo que solo se crea
+# en PostgreSQL. Sirve también la página anterior (recorrido inverso).
+CREATE_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS api_product_root_price_desc_idx ON api_product '
+    '(price_1 DESC NULLS LAST, id DESC) '
+    'WHERE (NOT is_removed AND parent_id IS NULL AND NOT virtual)'
+)
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS api_product_root_price_desc_idx'
+
+
+def create_price_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_price_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_organization_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('parent__isnull', False)), fields=['parent'], name='api_product_parent_idx'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variations', to='api.product', verbose_name='parent'),
+        ),
+        migrations.RunPython(create_price_desc_index, drop_price_desc_index),
+    ]
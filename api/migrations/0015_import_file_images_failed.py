@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_product_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfile',
+            name='images_failed',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='images failed'),
+        ),
+    ]
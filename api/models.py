@@ -1,12 +1,22 @@
+import collections
+
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.contrib.auth.models import Group
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from model_utils.models import TimeStampedModel, SoftDeletableModel
 from slugify import slugify
+from .cache import bump_generation
 
 # Constantes
 STOCK_STATUS = (
@@ -27,6 +37,30 @@ CURRENCY = (
     ('PEN', 'Sol (PEN)'),
 )
 
+IMPORT_MODE = (
+    ('batch', _('batch')),
+    ('copy', _('copy (PostgreSQL)')),
+)
+
+IMPORT_STATUS = (
+    ('pending', _('pending')),
+    ('processing', _('processing')),
+    ('done', _('done')),
+    ('failed', _('failed')),
+)
+
+# Configuración de texto de PostgreSQL para la búsqueda de productos
+SEARCH_CONFIG = 'spanish'
+
+# Intentos de guardar con un slug generado si otro proceso lo toma antes
+SLUG_ATTEMPTS = 3
+# Largo reservado en el slug para el sufijo de los repetidos ("-12")
+SLUG_SUFFIX_LENGTH = 10
+
+# Predicado de los listados de productos: productos raíz no virtuales y no
+# eliminados (Product.objects.filter(parent=None, virtual=False))
+ROOT_PRODUCT = models.Q(parent__isnull=True, virtual=False, is_removed=False)
+
 # Modelo base para la organización
 class OrganizationRelatedModel(models.Model):
     organization = models.ForeignKey(
@@ -95,6 +129,14 @@ class Images(TimeStampedModel, SoftDeletableModel, OrganizationRelatedModel):
         upload_to='images/',
         verbose_name=_('image')
     )
+    # sha256 del archivo original; evita guardar dos veces el mismo contenido
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('content hash'))
 
     class Meta:
         verbose_name = _('image')
@@ -143,9 +185,51 @@ class BaseModel(models.Model):
         abstract = True
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        organization_id = getattr(self, 'organization_id', None)
+        for attempt in range(SLUG_ATTEMPTS):
+            self.slug = self.get_unique_slugs(organization_id, [self.name], exclude_pk=self.pk)[0]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Otro proceso tomó el mismo slug entre la consulta y el INSERT
+                taken = type(self)._base_manager.filter(organization_id=organization_id, slug=self.slug)
+                if attempt == SLUG_ATTEMPTS - 1 or not taken.exclude(pk=self.pk).exists():
+                    self.slug = None
+                    raise
+
+    @classmethod
+    def get_unique_slugs(cls, organization_id, names, exclude_pk=None, reserved=()):
+        """
+        Slugs libres dentro de la organización para `names`, en el mismo
+        orden. Si el slug ya existe (o está en `reserved`) o se repite en la
+        lista se agrega el primer sufijo libre ("mesa", "mesa-2", "mesa-3"...).
+        Son como mucho dos consultas sobre el índice único (slug, organization).
+        """
+        max_length = cls._meta.get_field('slug').max_length - SLUG_SUFFIX_LENGTH
+        bases = [slugify(name or '')[:max_length].strip('-') or cls._meta.model_name for name in names]
+        queryset = cls._base_manager.filter(organization_id=organization_id).order_by()
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        taken = set(queryset.filter(slug__in=set(bases)).values_list('slug', flat=True))
+        taken.update(reserved)
+        counts = collections.Counter(bases)
+        repeated = {base for base in counts if base in taken or counts[base] > 1}
+        if repeated:
+            prefixes = models.Q()
+            for base in repeated:
+                prefixes |= models.Q(slug__startswith=f'{base}-')
+            taken.update(queryset.filter(prefixes).values_list('slug', flat=True))
+        slugs = []
+        for base in bases:
+            slug, suffix = base, 2
+            while slug in taken:
+                slug, suffix = f'{base}-{suffix}', suffix + 1
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
 
 # Modelo de Categoría
 class Category(BaseModel, OrganizationRelatedModel):
@@ -171,14 +255,78 @@ class Category(BaseModel, OrganizationRelatedModel):
     virtual = models.BooleanField(
         default=False,
         verbose_name=_('virtual'))
+    # Ruta materializada con los ids de los ancestros, ej. "1/5/12/"
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name=_('path'))
 
     class Meta:
         verbose_name = _('category')
         verbose_name_plural = _('categories')
+        indexes = [
+            models.Index(fields=['path'], name='api_category_path_idx', opclasses=['varchar_pattern_ops']),
+            # Listado y árbol de CategoryViewSet: virtual=False ordenado por (order, name)
+            models.Index(fields=['order', 'name'], name='api_category_order_idx', condition=models.Q(virtual=False)),
+        ]
+        constraints = [
+            # Búsqueda por slug (con o sin organización) y unicidad por organización
+            models.UniqueConstraint(fields=['slug', 'organization'], name='api_category_slug_org_uniq',
+                                    opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        old_path = ''
+        if self.pk:
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if old_path and parent_path.startswith(old_path):
+                raise ValidationError(_('A category cannot be moved inside itself.'))
+        super().save(*args, **kwargs)
+        self.update_path(old_path, parent_path)
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and self.parent.path.startswith(self.path or '-'):
+            raise ValidationError({'parent': _('A category cannot be moved inside itself.')})
+
+    def update_path(self, old_path, parent_path):
+        """
+        Guarda la ruta materializada y, si la categoría cambió de padre,
+        reescribe la de todos sus descendientes en una sola sentencia.
+        """
+        new_path = f'{parent_path}{self.pk}/'
+        self.path = new_path
+        if new_path == old_path:
+            return
+        Category.objects.filter(pk=self.pk).update(path=new_path)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)))
+
+    def get_ancestors(self, include_self=False):
+        """
+        Ancestros desde la raíz, resueltos con una sola consulta
+        """
+        ids = [int(pk) for pk in self.path.split('/') if pk]
+        if not include_self:
+            ids = ids[:-1]
+        categories = Category.objects.in_bulk(ids)
+        return [categories[pk] for pk in ids if pk in categories]
+
+    def get_descendants(self, include_self=False):
+        queryset = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
 # Modelo de Marca
 class Brand(BaseModel, OrganizationRelatedModel):
     parent = models.ForeignKey(
@@ -201,6 +349,15 @@ class Brand(BaseModel, OrganizationRelatedModel):
     class Meta:
         verbose_name = _('brand')
         verbose_name_plural = _('brands')
+        indexes = [
+            # BrandViewSet: marcas raíz ordenadas por (order, name)
+            models.Index(fields=['order', 'name'], name='api_brand_order_idx', condition=models.Q(parent__isnull=True)),
+        ]
+        constraints = [
+            # Slug único por organización (ver Category)
+            models.UniqueConstraint(fields=['slug', 'organization'], name='api_brand_slug_org_uniq',
+                                    opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ]
 
     def __str__(self):
         return self.name
@@ -287,12 +444,14 @@ class Product(BaseModel, TimeStampedModel, SoftDeletableModel, Dimensions, Organ
         choices=STOCK_STATUS,
         default='instock',
         verbose_name=_('stock status'))
+    # Sin índice completo: ver api_product_parent_idx
     parent = models.ForeignKey(
         'self',
         blank=True,
         null=True,
         on_delete=models.CASCADE,
         related_name='variations',
+        db_index=False,
         verbose_name=_('parent')
     )
     brand = models.ForeignKey(
@@ -312,11 +471,45 @@ class Product(BaseModel, TimeStampedModel, SoftDeletableModel, Dimensions, Organ
     virtual = models.BooleanField(
         default=False,
         verbose_name=_('virtual'))
+    # Huella de la última fila importada (ver api.importers.ProductImporter)
+    import_fingerprint = models.CharField(
+        max_length=32,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('import fingerprint'))
+    # Mantenido por update_search_vector; índice GIN solo en PostgreSQL
+    search_vector = SearchVectorField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('search vector'))
 
     class Meta:
         verbose_name = _('product')
         verbose_name_plural = _('products')
         ordering = ['-created']
+        indexes = [
+            # Feed de cambios (ProductChangesView): orden (modified, id) por organización
+            models.Index(fields=['organization', 'modified', 'id'], name='api_product_org_modified_idx'),
+            # Listados de productos raíz (ProductView, ProductViewSet): índices parciales
+            # sobre ROOT_PRODUCT, con `id` como desempate de la paginación por cursor
+            models.Index(fields=['created', 'id'], name='api_product_root_created_idx', condition=ROOT_PRODUCT),
+            models.Index(fields=['name', 'id'], name='api_product_root_name_idx', condition=ROOT_PRODUCT),
+            models.Index(fields=['price_1', 'id'], name='api_product_root_price_idx', condition=ROOT_PRODUCT),
+            models.Index(fields=['organization', 'created', 'id'], name='api_product_root_org_idx',
+                         condition=ROOT_PRODUCT),
+            models.Index(fields=['brand', 'created', 'id'], name='api_product_root_brand_idx', condition=ROOT_PRODUCT),
+            # Variaciones por padre. Parcial para que `parent_id IS NULL` de los
+            # listados no pueda usarlo: con él el planificador filtraba por
+            # parent_id y ordenaba aparte en vez de recorrer el índice raíz
+            models.Index(fields=['parent'], name='api_product_parent_idx', condition=models.Q(parent__isnull=False)),
+        ]
+        constraints = [
+            # Slug único por organización (ver Category)
+            models.UniqueConstraint(fields=['slug', 'organization'], name='api_product_slug_org_uniq',
+                                    opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ]
 
     def __str__(self):
         variations = f" ({_('variation')})" if self.parent else ''
@@ -380,6 +573,56 @@ class ImportFile(TimeStampedModel, SoftDeletableModel, OrganizationRelatedModel)
         related_name='imported_files',
         verbose_name=_('user created')
     )
+    # copy: carga masiva con COPY FROM STDIN (solo PostgreSQL)
+    mode = models.CharField(
+        max_length=20,
+        choices=IMPORT_MODE,
+        default='batch',
+        verbose_name=_('mode'))
+    # Progreso de la importación; rows_read es el punto de control desde el
+    # que se reanuda (filas del archivo ya confirmadas, válidas o no)
+    status = models.CharField(
+        max_length=20,
+        choices=IMPORT_STATUS,
+        default='pending',
+        editable=False,
+        verbose_name=_('status'))
+    rows_read = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('rows read'))
+    rows_processed = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('rows processed'))
+    rows_skipped = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('rows skipped'))
+    rows_failed = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('rows failed'))
+    # Imágenes del zip que no se pudieron importar (no son filas del archivo)
+    images_failed = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('images failed'))
+    errors = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name=_('errors'))
+    started_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('started at'))
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('finished at'))
 
     class Meta:
         verbose_name = _('import file')
@@ -442,32 +685,201 @@ class Slide(BaseModel, OrganizationRelatedModel):
     class Meta:
         verbose_name = _('slide')
         verbose_name_plural = _('slides')
+        indexes = [
+            # SlideViewSet: slides raíz ordenados por (order, name)
+            models.Index(fields=['order', 'name'], name='api_slide_order_idx', condition=models.Q(parent__isnull=True)),
+        ]
 
     def __str__(self):
         return "{}".format(self.name)
 
-# Señales
-@receiver(post_save, sender=Category)
-@prevent_recursion
-def save_category(sender, instance=None, created=False, **kwargs):
+# Búsqueda de texto completo
+def product_search_vector():
     """
-    Guarda la categoría asegurando que tenga un slug
+    tsvector ponderado del producto: nombre (A), sku (B), marca y
+    categorías (C) y descripciones (D)
     """
-    if not instance.slug:
-        instance.slug = slugify(instance.name)
-        instance.save(update_fields=['slug'])
+    brand_name = Subquery(Brand.objects.filter(pk=OuterRef('brand_id')).values('name')[:1])
+    category_names = Subquery(
+        Category.objects.filter(products=OuterRef('pk'))
+        .order_by()
+        .values('products')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('sku', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(brand_name, category_names, weight='C', config=SEARCH_CONFIG)
+        + SearchVector('short_description', 'description', weight='D', config=SEARCH_CONFIG)
+    )
 
+
+def update_search_vector(queryset):
+    """
+    Recalcula el tsvector de los productos del queryset en una sola sentencia.
+    Solo aplica en PostgreSQL; en otros motores la búsqueda usa icontains.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    queryset.update(search_vector=product_search_vector())
+
+
+def adjust_stock(queryset, delta, modified=None):
+    """
+    Suma `delta` (positivo o negativo) al stock de los productos del queryset
+    con manage_stock, en una sola sentencia UPDATE y sin leer antes la fila:
+    el bloqueo dura lo que la sentencia y las ventas simultáneas no se
+    pisan. Una resta que deje el stock bajo cero no se aplica, y
+    stock_status se recalcula en la misma sentencia (instock si queda stock;
+    si no, onbackorder se mantiene y el resto pasa a outofstock). Los
+    productos sin manage_stock no se modifican. Devuelve el número de filas
+    modificadas.
+    """
+    quantity = Coalesce(F('stock_quantity'), 0) + delta
+    queryset = queryset.filter(manage_stock=True)
+    if delta < 0:
+        queryset = queryset.filter(GreaterThanOrEqual(quantity, 0))
+    stock_status = Case(
+        When(GreaterThan(quantity, 0), then=Value('instock')),
+        When(stock_status='onbackorder', then=Value('onbackorder')),
+        default=Value('outofstock'),
+    )
+    return queryset.update(
+        stock_quantity=quantity,
+        stock_status=stock_status,
+        modified=modified or timezone.now(),
+    )
+
+# Señales
 @receiver(post_save, sender=ImportFile)
 @prevent_recursion
 def handle_import_file(sender, instance=None, created=False, **kwargs):
     """
-    Maneja la importación de archivos
+    Encola la importación del archivo cuando se confirma la transacción
     """
     if created and not instance.uploaded:
-        # Aquí iría la lógica para procesar el archivo de importación
-        # Por ahora, solo marcamos como subido
-        instance.uploaded = True
-        instance.save(update_fields=['uploaded'])
-        # En producción, aquí podrías llamar a una tarea Celery
-        # from .tasks import process_import_file
-        # process_import_file.delay(instance.id)
+        from .tasks import process_import_file
+        transaction.on_commit(lambda: process_import_file.delay(instance.pk))
+
+@receiver(post_save, sender=Product)
+def product_search_vector_save(sender, instance=None, **kwargs):
+    update_search_vector(Product.all_objects.filter(pk=instance.pk))
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_search_vector_categories(sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_search_vector(Product.all_objects.filter(pk=instance.pk))
+    elif pk_set:
+        update_search_vector(Product.all_objects.filter(pk__in=pk_set))
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def catalogue_search_vector_save(sender, instance=None, created=False, **kwargs):
+    """
+    Los nombres de marca y categoría están desnormalizados en el tsvector
+    """
+    if not created:
+        lookup = 'brand' if sender is Brand else 'categories'
+        update_search_vector(Product.all_objects.filter(**{lookup: instance}))
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+def catalogue_search_vector_pre_delete(sender, instance=None, **kwargs):
+    # Tras el borrado ya no se puede saber qué productos estaban asociados
+    if connection.vendor == 'postgresql':
+        instance._search_product_ids = list(instance.products.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def catalogue_search_vector_delete(sender, instance=None, **kwargs):
+    product_ids = getattr(instance, '_search_product_ids', None)
+    if product_ids:
+        update_search_vector(Product.all_objects.filter(pk__in=product_ids))
+
+# Invalidación de la caché de respuestas del catálogo
+CACHE_TAGS = {
+    Product: 'product',
+    MetaData: 'product',
+    Category: 'category',
+    Brand: 'brand',
+    Slide: 'slide',
+    Images: 'images',
+}
+
+# Objetos que incluyen en su respuesta a marcas, categorías e imágenes, que
+# pueden ser de otra organización: {modelo: [(modelo que lo incluye, lookups)]}
+CACHE_REFERENCES = {
+    Brand: [(Product, ('brand', 'brand__parent'))],
+    Category: [(Product, ('categories',))],
+    Images: [
+        (Product, ('images', 'brand__images', 'brand__parent__images', 'categories__images')),
+        (Brand, ('images',)),
+        (Category, ('images',)),
+        (Slide, ('images',)),
+    ],
+}
+
+def cache_organization(instance):
+    if isinstance(instance, MetaData):
+        return Product.all_objects.filter(pk=instance.product_id).values_list('organization_id', flat=True).first()
+    return getattr(instance, 'organization_id', None)
+
+def cache_organizations(instance, referenced=True):
+    """
+    Organizaciones cuyas respuestas incluyen el objeto: la suya y, si
+    `referenced`, las de los objetos que lo incluyen (CACHE_REFERENCES).
+    None (todas, ver bump_generation) si el objeto no tiene organización
+    """
+    organization = cache_organization(instance)
+    organizations = {organization}
+    if organization is None or not referenced:
+        return organizations
+    for model, lookups in CACHE_REFERENCES.get(type(instance), ()):
+        condition = models.Q()
+        for lookup in lookups:
+            condition |= models.Q(**{lookup: instance.pk})
+        organizations.update(model._base_manager.filter(condition).order_by()
+                             .values_list('organization_id', flat=True).distinct())
+    return organizations
+
+def invalidate_cache_pre_delete(sender, instance=None, **kwargs):
+    # Tras el borrado ya no se puede saber qué objetos lo incluían
+    instance._cache_organizations = cache_organizations(instance)
+
+def invalidate_cache(sender, instance=None, created=False, **kwargs):
+    organizations = getattr(instance, '_cache_organizations', None)
+    if organizations is None:
+        # Un objeto recién creado todavía no está incluido en otros
+        organizations = cache_organizations(instance, referenced=not created)
+    for organization in organizations:
+        bump_generation(CACHE_TAGS[sender], organization)
+
+def invalidate_cache_m2m(sender, instance=None, action=None, model=None, reverse=False, pk_set=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Cambia la respuesta de los objetos del lado que declara la relación
+    if not reverse:
+        organizations = cache_organizations(instance)
+    elif pk_set:
+        organizations = set()
+        for changed in model._base_manager.filter(pk__in=pk_set):
+            organizations |= cache_organizations(changed)
+    else:
+        # post_clear inverso: no se sabe qué objetos cambiaron
+        organizations = {None}
+    for organization in organizations:
+        bump_generation(CACHE_TAGS[type(instance)], organization)
+        bump_generation(CACHE_TAGS[model], organization)
+
+for model in CACHE_TAGS:
+    post_save.connect(invalidate_cache, sender=model, dispatch_uid=f'invalidate_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_cache, sender=model, dispatch_uid=f'invalidate_cache_delete_{model.__name__}')
+for model in CACHE_REFERENCES:
+    pre_delete.connect(invalidate_cache_pre_delete, sender=model, dispatch_uid=f'invalidate_cache_pre_delete_{model.__name__}')
+
+for through in (Product.categories.through, Product.images.through, Category.images.through,
+                Brand.images.through, Slide.images.through):
+    m2m_changed.connect(invalidate_cache_m2m, sender=through, dispatch_uid=f'invalidate_cache_m2m_{through.__name__}')
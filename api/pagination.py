@@ -0,0 +1,163 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre un campo de orden más `id` como
+    desempate. Cada página filtra con `(campo, id) > (valor, id)` en vez de
+    usar OFFSET y no ejecuta COUNT(*), por lo que su costo no depende de la
+    profundidad. Los NULL se ordenan siempre al final.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_fields = ('name', 'price_1', 'created')
+    default_ordering = '-created'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.model = queryset.model
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.field = self.ordering.lstrip('-')
+        self.descending = self.ordering.startswith('-')
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['r'])
+
+        queryset = queryset.order_by(*self.get_order_by(self.reverse))
+        if cursor:
+            queryset = queryset.filter(self.get_position_filter(cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset):
+        """
+        Primer término de orden del queryset (OrderingFilter o Meta.ordering)
+        si es uno de los campos soportados; si no, el orden por defecto.
+        """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if ordering and isinstance(ordering[0], str) and ordering[0].lstrip('-') in self.ordering_fields:
+            return ordering[0]
+        return self.default_ordering
+
+    def get_order_by(self, reverse):
+        descending = self.descending != reverse
+        # Los NULL van al final; al recorrer hacia atrás quedan primero. En
+        # columnas NOT NULL se omite para que coincida con el orden del índice
+        nulls = {}
+        if self.model._meta.get_field(self.field).null:
+            nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        field = F(self.field).desc(**nulls) if descending else F(self.field).asc(**nulls)
+        return [field, '-id' if descending else 'id']
+
+    def get_position_filter(self, cursor):
+        value, pk = cursor['v'], cursor['id']
+        after, before = ('lt', 'gt') if self.descending else ('gt', 'lt')
+        field = self.field
+        if not cursor['r']:
+            if value is None:
+                return Q(**{f'{field}__isnull': True, f'id__{after}': pk})
+            position = Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'id__{after}': pk})
+            if self.model._meta.get_field(field).null:
+                position |= Q(**{f'{field}__isnull': True})
+            return position
+        if value is None:
+            return Q(**{f'{field}__isnull': False}) | Q(**{f'{field}__isnull': True, f'id__{before}': pk})
+        return Q(**{f'{field}__{before}': value}) | Q(**{field: value, f'id__{before}': pk})
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_').decode('utf-8'))
+            if cursor['o'] != self.ordering:
+                raise ValueError
+            model_field = self.model._meta.get_field(self.field)
+            cursor['v'] = None if cursor['v'] is None else model_field.to_python(cursor['v'])
+            cursor['id'] = int(cursor['id'])
+            cursor['r'] = bool(cursor.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse):
+        value = getattr(instance, self.field)
+        if value is not None:
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        cursor = {
+            'o': self.ordering,
+            'v': value,
+            'id': instance.pk,
+            'r': int(reverse),
+        }
+        encoded = b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'), altchars=b'-_').decode('ascii')
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Paginación por número de página (usada por el admin) con modo cursor
+    opcional: si la petición incluye ?cursor= (vacío para la primera página)
+    se delega en KeysetPagination.
+    """
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
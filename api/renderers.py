@@ -0,0 +1,83 @@
+import decimal
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = encoders.JSONEncoder()
+
+
+def encode_default(value):
+    """
+    Tipos que orjson y msgpack no codifican por sí solos, con el mismo
+    resultado que el JSONEncoder de DRF. Los Decimal van primero por ser
+    los más frecuentes (los serializadores ya los convierten a texto).
+    """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return _encoder.default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer sobre orjson. Genera la misma salida que el renderer de DRF
+    (compacta, UTF-8 sin escapar, fechas en UTC con `Z`, \\u2028 y \\u2029
+    escapados) en una fracción del tiempo. Con sangría (?format=api o
+    `Accept: application/json; indent=4`), si orjson no está instalado o si
+    el contenido no se puede codificar (enteros de más de 64 bits) se usa
+    el renderer de DRF.
+    """
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack para clientes internos (`Accept: application/msgpack`).
+    Los valores son los mismos que en JSON. Requiere el paquete msgpack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Cuerpos `Content-Type: application/msgpack`. Requiere el paquete msgpack.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
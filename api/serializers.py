@@ -1,17 +1,172 @@
+from contextlib import nullcontext
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.fields import SkipField, get_attribute
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator
+from .cache import bump_generation
 from .models import *
 
 
+# Tipos de paso de un plan compilado (ver SerializerPlan)
+PLAN_FIELD, PLAN_PK, PLAN_MANY_PK, PLAN_METHOD, PLAN_NESTED, PLAN_NESTED_MANY, PLAN_GENERIC = range(7)
+
+
+class SerializerPlan:
+    """
+    Disposición de los campos de lectura de un serializer, calculada una vez.
+    render() produce el mismo resultado que Serializer.to_representation,
+    pero sin reconstruir los serializers anidados por cada instancia y
+    leyendo directamente los atributos y cachés de prefetch del modelo.
+    Los serializers que cambian sus campos en to_representation deben
+    hacerlo en expand_fields() para poder compilarse.
+    """
+
+    def __init__(self, serializer):
+        expand_fields = getattr(serializer, 'expand_fields', None)
+        if expand_fields is not None:
+            expand_fields()
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        self.concrete_fields = {field.name for field in model._meta.concrete_fields} if model else set()
+        # Un plan se comparte entre peticiones solo si no depende del contexto
+        self.cacheable = True
+        self.steps = [self.compile_field(field) for field in serializer._readable_fields]
+
+    def compile_field(self, field):
+        name, source = field.field_name, field.source_attrs
+        if isinstance(field, serializers.SerializerMethodField):
+            # Se llama sobre el serializer actual, con su propio contexto
+            return name, PLAN_METHOD, field.method_name, None
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer) and is_compilable(nested):
+            # Los métodos de un anidado usarían el contexto con que se compiló
+            if any(isinstance(item, serializers.SerializerMethodField) for item in nested.fields.values()):
+                self.cacheable = False
+            kind = PLAN_NESTED_MANY if nested is not field else PLAN_NESTED
+            return name, kind, source, [nested, None]
+        if (isinstance(field, serializers.ManyRelatedField) and len(source) == 1
+                and isinstance(field.child_relation, serializers.PrimaryKeyRelatedField)
+                and field.child_relation.pk_field is None):
+            return name, PLAN_MANY_PK, source[0], None
+        if (isinstance(field, serializers.PrimaryKeyRelatedField) and len(source) == 1
+                and field.pk_field is None and field.use_pk_only_optimization()):
+            return name, PLAN_PK, source[0], None
+        if (len(source) == 1 and source[0] in self.concrete_fields
+                and type(field).get_attribute is serializers.Field.get_attribute):
+            return name, PLAN_FIELD, source[0], field
+        return name, PLAN_GENERIC, None, field
+
+    def render(self, serializer, instance):
+        ret = {}
+        for name, kind, source, extra in self.steps:
+            if kind == PLAN_FIELD:
+                value = getattr(instance, source)
+                ret[name] = None if value is None else extra.to_representation(value)
+            elif kind == PLAN_PK:
+                ret[name] = instance.serializable_value(source)
+            elif kind == PLAN_MANY_PK:
+                ret[name] = [] if instance.pk is None else [item.pk for item in getattr(instance, source).all()]
+            elif kind == PLAN_METHOD:
+                ret[name] = getattr(serializer, source)(instance)
+            elif kind == PLAN_NESTED:
+                value = get_attribute(instance, source)
+                ret[name] = None if value is None else get_plan(extra).render(extra[0], value)
+            elif kind == PLAN_NESTED_MANY:
+                value = get_attribute(instance, source)
+                if value is None:
+                    ret[name] = None
+                else:
+                    plan = get_plan(extra)
+                    items = value.all() if isinstance(value, models.Manager) else value
+                    ret[name] = [plan.render(extra[0], item) for item in items]
+            else:
+                try:
+                    attribute = extra.get_attribute(instance)
+                except SkipField:
+                    continue
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                ret[name] = None if check_for_none is None else extra.to_representation(attribute)
+        return ret
+
+
+def is_compilable(serializer):
+    """
+    Un serializer se puede compilar si no redefine to_representation o si
+    concentra esos cambios en expand_fields()
+    """
+    overrides = type(serializer).to_representation is not serializers.Serializer.to_representation
+    return isinstance(serializer, serializers.Serializer) and (not overrides or hasattr(serializer, 'expand_fields'))
+
+
+def get_plan(slot):
+    """
+    Compila bajo demanda el plan de un serializer anidado ([serializer, plan])
+    """
+    if slot[1] is None:
+        slot[1] = SerializerPlan(slot[0])
+    return slot[1]
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer de lectura que compila el serializer hijo una sola vez
+    (SerializerPlan) en vez de recorrer la maquinaria de campos de DRF por
+    cada instancia. La salida es idéntica a la de ListSerializer.
+
+    Sin `request` en el contexto (listas anidadas como variaciones o
+    categorías) el plan se guarda por clase y por `plan_context_keys` del
+    hijo, así que tampoco se reconstruyen sus campos en cada lista.
+    """
+    plans = {}
+    # ?fields= / ?expand= generan claves distintas; se limita lo que se guarda
+    max_plans = 256
+
+    def to_representation(self, data):
+        if not is_compilable(self.child):
+            return super().to_representation(data)
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        plan = self.get_plan()
+        child = self.child
+        return [plan.render(child, item) for item in iterable]
+
+    def get_plan(self):
+        key = self.get_plan_key()
+        plan = self.plans.get(key) if key is not None else None
+        if plan is None:
+            plan = SerializerPlan(self.child)
+            if key is not None and plan.cacheable and len(self.plans) < self.max_plans:
+                self.plans[key] = plan
+        return plan
+
+    def get_plan_key(self):
+        context = self.child.context
+        if 'request' in context:
+            return None
+        values = []
+        for name in getattr(self.child, 'plan_context_keys', ()):
+            value = context.get(name)
+            values.append(tuple(sorted(value)) if isinstance(value, (set, frozenset)) else value)
+        return type(self.child), tuple(values)
+
+
 class CategoryLiteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['path']
 
 
 class CategoryBaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['path']
+        list_serializer_class = CompiledListSerializer
 
 
 class CategoryBasicSerializer(serializers.ModelSerializer):
@@ -26,10 +181,49 @@ class SlideSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ProductSuggestSerializer(serializers.ModelSerializer):
+    thumbnail = serializers.ImageField(source='image', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'sku', 'slug', 'thumbnail']
+
+
 class ImagesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Images
-        fields = '__all__'
+        exclude = ['content_hash']
+
+
+def build_category_tree(categories):
+    """
+    Arma en memoria el árbol de categorías a partir de un único queryset.
+    Retorna las categorías raíz y el mapa padre -> hijos, que se pasa a
+    CategorySerializer / CategoryLiteSerializer en el contexto
+    `category_childs` para que no consulten la base por cada nodo.
+    """
+    nodes = {category.pk: category for category in categories}
+    childs_map = {pk: [] for pk in nodes}
+    roots = []
+    for category in nodes.values():
+        if category.parent_id is None:
+            roots.append(category)
+        elif category.parent_id in childs_map:
+            # Evita la consulta del padre al serializar `parent`
+            Category.parent.field.set_cached_value(category, nodes[category.parent_id])
+            childs_map[category.parent_id].append(category)
+    return roots, childs_map
+
+
+def get_category_childs(obj, context):
+    """
+    Hijos no virtuales de una categoría y el contexto para serializarlos.
+    Usa el mapa `category_childs` si el árbol ya fue cargado.
+    """
+    childs_map = context.get('category_childs')
+    if childs_map is not None:
+        return childs_map.get(obj.pk), {'category_childs': childs_map}
+    return Category.objects.filter(parent=obj, virtual=False), {}
 
 
 class CategoryLiteSerializer(serializers.ModelSerializer):
@@ -39,9 +233,9 @@ class CategoryLiteSerializer(serializers.ModelSerializer):
     def get_childs(self, obj):
         result = None
         try:
-            queryset = Category.objects.filter(parent=obj, virtual=False)
-            if queryset.exists():
-                serializer = CategoryLiteSerializer(queryset, many=True)
+            queryset, context = get_category_childs(obj, self.context)
+            if queryset:
+                serializer = CategoryLiteSerializer(queryset, many=True, context=context)
                 result = serializer.data
         except Exception as ex:
             print(ex)
@@ -52,18 +246,57 @@ class CategoryLiteSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent', 'childs']
 
 
-class CategorySerializer(serializers.ModelSerializer):
-    def to_representation(self, instance):
+class UniqueSlugMixin:
+    """
+    Un slug indicado explícitamente no puede repetirse en la organización
+    (restricción única (slug, organization)); los que genera BaseModel.save
+    ya son únicos
+    """
+    # Pares (organización, slug) existentes, precargados por las altas masivas;
+    # con None se consulta la base
+    known_slugs = None
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if 'slug' not in attrs and 'organization' not in attrs:
+            return attrs
+        slug = attrs['slug'] if 'slug' in attrs else getattr(self.instance, 'slug', None)
+        if not slug:
+            return attrs
+        organization = attrs['organization'] if 'organization' in attrs else getattr(self.instance, 'organization', None)
+        if self.known_slugs is not None and self.instance is None:
+            exists = (getattr(organization, 'pk', organization), slug) in self.known_slugs
+        else:
+            queryset = self.Meta.model._base_manager.filter(slug=slug, organization=organization)
+            if self.instance is not None:
+                queryset = queryset.exclude(pk=self.instance.pk)
+            exists = queryset.exists()
+        if exists:
+            raise serializers.ValidationError({'slug': 'This slug already exists in the organization.'})
+        return attrs
+
+
+class CategorySerializer(UniqueSlugMixin, serializers.ModelSerializer):
+    def expand_fields(self):
         self.fields['parent'] = CategoryBasicSerializer()
         self.fields['childs'] = serializers.SerializerMethodField()
+
+    def to_representation(self, instance):
+        self.expand_fields()
         return super(CategorySerializer, self).to_representation(instance)
 
+    def validate_parent(self, value):
+        # Misma comprobación que Category.save, como error 400 en vez de 500
+        if value is not None and self.instance is not None and value.path.startswith(self.instance.path or '-'):
+            raise serializers.ValidationError('A category cannot be moved inside itself.')
+        return value
+
     def get_childs(self, obj):
         result = None
         try:
-            queryset = Category.objects.filter(parent=obj, virtual=False)
-            if queryset.exists():
-                serializer = CategorySerializer(queryset, many=True)
+            queryset, context = get_category_childs(obj, self.context)
+            if queryset:
+                serializer = CategorySerializer(queryset, many=True, context=context)
                 result = serializer.data
         except Exception as ex:
             print(ex)
@@ -71,33 +304,128 @@ class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['path']
+        list_serializer_class = CompiledListSerializer
 
 
-class BrandSerializer(serializers.ModelSerializer):
-    def to_representation(self, instance):
+class BrandSerializer(UniqueSlugMixin, serializers.ModelSerializer):
+    def expand_fields(self):
         self.fields['parent'] = BrandSerializer()
+
+    def to_representation(self, instance):
+        self.expand_fields()
         return super(BrandSerializer, self).to_representation(instance)
 
     class Meta:
         model = Brand
         fields = '__all__'
+        list_serializer_class = CompiledListSerializer
+
+
+class ProductSerializer(UniqueSlugMixin, serializers.ModelSerializer):
+    """
+    Admite campos parciales y expansión explícita con ?fields=id,name,price_1
+    y ?expand=brand,images (en el contexto `fields` / `expand` para las
+    variaciones). Sin ?expand= se expanden todas las relaciones; las no
+    expandidas se devuelven como ids y las variaciones se omiten.
+    """
+    # Niveles de variaciones que se precargan en setup_eager_loading
+    VARIATIONS_DEPTH = 2
+    EXPANDABLE_FIELDS = ('variations', 'brand', 'images', 'categories')
+    # Claves del contexto que cambian los campos (ver CompiledListSerializer)
+    plan_context_keys = ('fields', 'expand')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = self.get_sparse_fieldset(self.context)
+        self.expand = set(self.EXPANDABLE_FIELDS) if expand is None else expand
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        self.requested_fields = fields
+
+    @classmethod
+    def get_sparse_fieldset(cls, context):
+        """
+        Campos (?fields=) y relaciones a expandir (?expand=) pedidos; None si
+        no se indicaron. Solo aplica a lecturas.
+        """
+        request = context.get('request')
+        if request is not None:
+            if request.method not in ('GET', 'HEAD'):
+                return None, None
+            params = request.query_params
+        else:
+            params = context
+        fields, expand = params.get('fields'), params.get('expand')
+        if fields is not None and not isinstance(fields, set):
+            fields = {name.strip() for name in fields.split(',') if name.strip()} or None
+        if expand is not None and not isinstance(expand, set):
+            expand = {name.strip() for name in expand.split(',') if name.strip()} & set(cls.EXPANDABLE_FIELDS)
+        return fields, expand
+
+    def is_expanded(self, name):
+        return name in self.expand and (self.requested_fields is None or name in self.requested_fields)
+
+    def expand_fields(self):
+        if self.is_expanded('variations'):
+            self.fields['variations'] = serializers.SerializerMethodField()
+        if self.is_expanded('brand'):
+            self.fields['brand'] = BrandSerializer()
+        if self.is_expanded('images'):
+            self.fields['images'] = ImagesSerializer(many=True)
+        if self.is_expanded('categories'):
+            self.fields['categories'] = serializers.SerializerMethodField()
 
-class ProductSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
-        self.fields['variations'] = serializers.SerializerMethodField()
-        self.fields['brand'] = BrandSerializer()
-        self.fields['images'] = ImagesSerializer(many=True)
-        self.fields['categories'] = serializers.SerializerMethodField()
+        self.expand_fields()
         return super(ProductSerializer, self).to_representation(instance)
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, depth=None, fields=None, expand=None):
+        """
+        Precarga marca, imágenes, categorías y variaciones (con sus propias
+        relaciones) para serializar una página con un número constante de
+        consultas. Las variaciones más profundas que `depth` se consultan
+        bajo demanda. Con `fields` / `expand` (ver get_sparse_fieldset) solo
+        se leen las columnas y relaciones que se van a serializar.
+        """
+        if depth is None:
+            depth = cls.VARIATIONS_DEPTH
+        if expand is None:
+            expand = set(cls.EXPANDABLE_FIELDS)
+
+        def wanted(name):
+            return fields is None or name in fields
+
+        if fields is None:
+            queryset = queryset.defer('search_vector')
+        else:
+            concrete = {field.name for field in Product._meta.concrete_fields}
+            # parent es necesario para asociar las variaciones precargadas
+            queryset = queryset.only('id', 'parent', *(fields & concrete))
+        if wanted('brand') and 'brand' in expand:
+            queryset = queryset.select_related('brand__parent').prefetch_related(
+                'brand__images', 'brand__parent__images')
+        if wanted('images'):
+            queryset = queryset.prefetch_related('images')
+        if wanted('categories'):
+            queryset = queryset.prefetch_related('categories__images' if 'categories' in expand else 'categories')
+        if depth > 0 and wanted('variations') and 'variations' in expand:
+            variations = cls.setup_eager_loading(Product.objects.all(), depth - 1, fields, expand)
+            queryset = queryset.prefetch_related(Prefetch('variations', queryset=variations))
+        return queryset
+
     def get_variations(self, obj):
         result = None
         try:
-            queryset = Product.objects.filter(parent=obj)
-            if queryset.exists():
-                serializer = ProductSerializer(queryset, many=True)
+            # Usa la caché de prefetch_related si existe
+            queryset = obj.variations.all()
+            if queryset:
+                context = {}
+                if self.requested_fields is not None or self.expand != set(self.EXPANDABLE_FIELDS):
+                    context = {'fields': self.requested_fields, 'expand': self.expand}
+                serializer = ProductSerializer(queryset, many=True, context=context)
                 result = serializer.data
         except Exception as ex:
             print(ex)
@@ -114,4 +442,363 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['search_vector', 'import_fingerprint']
+        list_serializer_class = CompiledListSerializer
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer de escritura masiva. Cada elemento se valida por separado:
+    los inválidos se informan en el resultado sin impedir que se apliquen
+    los demás, que se guardan en una sola transacción (perform) con un solo
+    incremento de la generación de caché por organización.
+
+    Antes de validar, las relaciones por pk y los valores únicos del hijo se
+    resuelven con una consulta por campo para toda la lista (prefetch), así
+    que validar no consulta la base por elemento.
+    """
+    # Si es False, perform se ejecuta sin transacción envolvente
+    atomic = True
+
+    def apply(self):
+        """
+        Valida y guarda la lista; devuelve un resultado por elemento, en el
+        mismo orden: {'index', 'status', 'id', 'sku'} o {'index', 'status':
+        'error', 'errors'}
+        """
+        data = self.initial_data
+        if not isinstance(data, list) or not data:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Expected a non-empty list of items.']})
+        if len(data) > settings.PRODUCT_BULK_MAX_ITEMS:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                f'Ensure this list has no more than {settings.PRODUCT_BULK_MAX_ITEMS} items.']})
+        self.results = [None] * len(data)
+        self.prefetch([item for item in data if isinstance(item, dict)])
+        items = []
+        for index, item in enumerate(data):
+            try:
+                items.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.add_error(index, exc.detail)
+        if items:
+            with transaction.atomic() if self.atomic else nullcontext():
+                organizations = self.perform(items)
+            for organization in organizations:
+                bump_generation('product', organization)
+        return self.results
+
+    def prefetch(self, data):
+        """
+        Precarga los objetos referenciados por los campos PrimaryKeyRelatedField
+        (simples o múltiples) y los valores existentes de los campos con
+        UniqueValidator de todos los elementos
+        """
+        for name, field in self.child.fields.items():
+            if field.read_only:
+                continue
+            values = [item[name] for item in data if item.get(name) is not None]
+            if isinstance(field, serializers.ManyRelatedField):
+                relation = field.child_relation
+                values = [value for many in values if isinstance(many, list) for value in many if value is not None]
+            else:
+                relation = field
+            if isinstance(relation, serializers.PrimaryKeyRelatedField) and relation.pk_field is None:
+                queryset = relation.get_queryset()
+                pks = set()
+                for value in values:
+                    try:
+                        pks.add(queryset.model._meta.pk.to_python(value))
+                    except (DjangoValidationError, TypeError):
+                        pass
+                relation.to_internal_value = partial(get_prefetched_related, relation, queryset.in_bulk(pks))
+            for validator in list(field.validators):
+                if isinstance(validator, UniqueValidator) and validator.lookup == 'exact':
+                    existing = set(validator.queryset.filter(**{f'{field.source}__in': get_valid_values(field, values)})
+                                   .values_list(field.source, flat=True))
+                    field.validators = [
+                        PrefetchedUniqueValidator(existing, validator.message) if item is validator else item
+                        for item in field.validators
+                    ]
+
+    def perform(self, items):
+        """
+        Guarda los elementos válidos [(índice, datos)]; devuelve los ids de
+        las organizaciones modificadas. Por defecto crea cada elemento con
+        el create() del hijo; las subclases lo reemplazan por escrituras
+        masivas.
+        """
+        organizations = set()
+        for index, data in items:
+            instance = self.child.create(data)
+            self.add_result(index, 'created', instance)
+            organizations.add(instance.organization_id)
+        return organizations
+
+    def add_result(self, index, status, product):
+        self.results[index] = {'index': index, 'status': status, 'id': product.pk, 'sku': product.sku}
+
+    def add_error(self, index, errors):
+        if not isinstance(errors, dict):
+            errors = {api_settings.NON_FIELD_ERRORS_KEY: errors}
+        self.results[index] = {'index': index, 'status': 'error', 'errors': errors}
+
+
+def get_prefetched_related(relation, objects, data):
+    """
+    to_internal_value de PrimaryKeyRelatedField contra los objetos precargados
+    ({pk: objeto}), con los mismos errores
+    """
+    if isinstance(data, bool):
+        relation.fail('incorrect_type', data_type=type(data).__name__)
+    try:
+        pk = relation.get_queryset().model._meta.pk.to_python(data)
+    except (DjangoValidationError, TypeError):
+        relation.fail('incorrect_type', data_type=type(data).__name__)
+    if pk not in objects:
+        relation.fail('does_not_exist', pk_value=data)
+    return objects[pk]
+
+
+def get_valid_values(field, values):
+    """
+    Valores de entrada convertidos por el campo, omitiendo los inválidos
+    (su error se informa al validar el elemento)
+    """
+    valid = set()
+    for value in values:
+        try:
+            valid.add(field.to_internal_value(value))
+        except (serializers.ValidationError, TypeError):
+            pass
+    return valid
+
+
+class PrefetchedUniqueValidator:
+    """
+    UniqueValidator contra el conjunto de valores existentes precargado
+    """
+    def __init__(self, existing, message):
+        self.existing = existing
+        self.message = message
+
+    def __call__(self, value):
+        if value in self.existing:
+            raise serializers.ValidationError(self.message, code='unique')
+
+
+class ProductBulkCreateSerializer(BulkListSerializer):
+    """
+    Alta masiva con ProductSerializer como hijo: bulk_create de los
+    productos, un insert por relación (categorías, imágenes) y slugs únicos
+    generados por organización
+    """
+    relations = ('categories', 'images')
+
+    def prefetch(self, data):
+        super().prefetch(data)
+        # Slugs explícitos ya usados, para UniqueSlugMixin
+        slugs = get_valid_values(self.child.fields['slug'], [item['slug'] for item in data if item.get('slug')])
+        self.child.known_slugs = set(Product._base_manager.filter(slug__in=slugs).values_list('organization_id', 'slug'))
+
+    def perform(self, items):
+        products, relations = [], {}
+        skus, slugs = set(), set()
+        for index, data in items:
+            sku, slug = data.get('sku'), data.get('slug')
+            organization = data.get('organization')
+            # Los validadores solo comparan con la base, no dentro del lote
+            if sku and sku in skus:
+                self.add_error(index, {'sku': ['Duplicated in the batch.']})
+                continue
+            if slug and (organization, slug) in slugs:
+                self.add_error(index, {'slug': ['Duplicated in the batch.']})
+                continue
+            skus.add(sku)
+            slugs.add((organization, slug))
+            related = {name: data.pop(name) for name in self.relations if name in data}
+            product = Product(**data)
+            products.append((index, product))
+            relations[index] = related
+
+        missing = {}
+        for index, product in products:
+            if not product.slug:
+                missing.setdefault(product.organization_id, []).append(product)
+        for organization_id, group in missing.items():
+            names = [product.name for product in group]
+            reserved = {product.slug for index, product in products
+                        if product.slug and product.organization_id == organization_id}
+            for product, slug in zip(group, Product.get_unique_slugs(organization_id, names, reserved=reserved)):
+                product.slug = slug
+
+        Product.objects.bulk_create([product for index, product in products])
+        for name in self.relations:
+            field = Product._meta.get_field(name)
+            Through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            Through.objects.bulk_create([
+                Through(**{f'{source}_id': product.pk, f'{target}_id': related.pk})
+                for index, product in products for related in relations[index].get(name, ())
+            ], ignore_conflicts=True)
+        update_search_vector(Product.all_objects.filter(pk__in=[product.pk for index, product in products]))
+        for index, product in products:
+            self.add_result(index, 'created', product)
+        return {product.organization_id for index, product in products}
+
+
+class ProductBulkUpdateSerializer(BulkListSerializer):
+    """
+    Actualización masiva de precio y stock. Los productos se leen con una
+    consulta (por id o sku) y se escriben con un bulk_update por conjunto de
+    columnas modificadas (más `modified`); los elementos sin cambios no
+    escriben nada.
+    """
+
+    def perform(self, items):
+        fields = ProductPatchSerializer.Meta.update_fields
+        ids = {data['id'] for index, data in items if 'id' in data}
+        skus = {data['sku'] for index, data in items if 'id' not in data}
+        products = list(Product.objects.filter(Q(pk__in=ids) | Q(sku__in=skus))
+                        .only('id', 'sku', 'organization_id', *fields))
+        by_id = {product.pk: product for product in products}
+        by_sku = {product.sku: product for product in products}
+
+        changed = {}
+        applied = []
+        for index, data in items:
+            if 'id' in data:
+                product = by_id.get(data['id'])
+                key = 'id'
+            else:
+                product = by_sku.get(data['sku'])
+                key = 'sku'
+            if product is None:
+                self.add_error(index, {key: ['Not found.']})
+                continue
+            names = changed.setdefault(product.pk, set())
+            for name in fields:
+                if name in data and getattr(product, name) != data[name]:
+                    setattr(product, name, data[name])
+                    names.add(name)
+            applied.append((index, product))
+
+        now = timezone.now()
+        groups = {}
+        for product in products:
+            names = changed.get(product.pk)
+            if names:
+                product.modified = now
+                groups.setdefault(tuple(sorted(names)), []).append(product)
+        for names, group in groups.items():
+            Product.objects.bulk_update(group, [*names, 'modified'])
+        for index, product in applied:
+            self.add_result(index, 'updated' if changed[product.pk] else 'unchanged', product)
+        return {product.organization_id for product in products if changed.get(product.pk)}
+
+
+class ProductPatchSerializer(serializers.ModelSerializer):
+    """
+    Elemento de PATCH masivo: el producto por `id` o `sku` y los campos de
+    precio y stock que cambian
+    """
+    id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'sku' not in attrs:
+            raise serializers.ValidationError('Either id or sku is required.')
+        if not set(attrs) & set(self.Meta.update_fields):
+            raise serializers.ValidationError(f"Nothing to update, expected any of: {', '.join(self.Meta.update_fields)}.")
+        return attrs
+
+    class Meta:
+        model = Product
+        update_fields = ('price_1', 'price_2', 'stock_quantity', 'stock_status')
+        fields = ['id', 'sku', *update_fields]
+        list_serializer_class = ProductBulkUpdateSerializer
+
+
+class ProductStockAdjustSerializer(BulkListSerializer):
+    """
+    Ajuste de stock por diferencia. Cada elemento es un UPDATE independiente
+    (adjust_stock) fuera de una transacción común, para no retener los
+    bloqueos de las filas entre elementos. Son errores los productos sin
+    manage_stock y las restas que dejarían el stock bajo cero. Los
+    productos se resuelven antes con una consulta. El stock resultante se
+    lee en la misma transacción que el UPDATE, que retiene el bloqueo de la
+    fila hasta confirmar: no incluye ajustes concurrentes posteriores.
+    """
+    atomic = False
+
+    def perform(self, items):
+        ids = {data['id'] for index, data in items if 'id' in data}
+        skus = {data['sku'] for index, data in items if 'id' not in data}
+        products = list(Product.objects.filter(Q(pk__in=ids) | Q(sku__in=skus))
+                        .order_by().only('id', 'sku', 'organization_id', 'manage_stock'))
+        by_id = {product.pk: product for product in products}
+        by_sku = {product.sku: product for product in products}
+
+        now = timezone.now()
+        organizations = set()
+        for index, data in items:
+            if 'id' in data:
+                product = by_id.get(data['id'])
+                key = 'id'
+            else:
+                product = by_sku.get(data['sku'])
+                key = 'sku'
+            if product is None:
+                self.add_error(index, {key: ['Not found.']})
+            elif not product.manage_stock:
+                self.add_error(index, {'delta': ['Stock is not managed for this product.']})
+            else:
+                stock = None
+                with transaction.atomic():
+                    queryset = Product.objects.filter(pk=product.pk)
+                    if adjust_stock(queryset, data['delta'], modified=now):
+                        stock = queryset.order_by().values('stock_quantity', 'stock_status').get()
+                if stock:
+                    self.add_result(index, 'updated', product)
+                    self.results[index].update(stock)
+                    organizations.add(product.organization_id)
+                else:
+                    self.add_error(index, {'delta': ['Insufficient stock.']})
+        return organizations
+
+
+class StockAdjustSerializer(serializers.Serializer):
+    """
+    Elemento de ajuste de stock: el producto por `id` o `sku` y la cantidad
+    a sumar (negativa para descontar)
+    """
+    id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(required=False)
+    delta = serializers.IntegerField()
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'sku' not in attrs:
+            raise serializers.ValidationError('Either id or sku is required.')
+        if attrs['delta'] == 0:
+            raise serializers.ValidationError({'delta': ['Ensure this value is not zero.']})
+        return attrs
+
+    class Meta:
+        list_serializer_class = ProductStockAdjustSerializer
+
+
+class ImportFileStatusSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.SerializerMethodField()
+
+    def get_rows_per_second(self, obj):
+        if obj.started_at is None:
+            return None
+        elapsed = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return round(obj.rows_read / elapsed, 1) if elapsed > 0 else None
+
+    class Meta:
+        model = ImportFile
+        fields = [
+            'id', 'file', 'mode', 'status', 'uploaded', 'remove_all',
+            'rows_read', 'rows_processed', 'rows_skipped', 'rows_failed', 'images_failed', 'rows_per_second',
+            'errors', 'started_at', 'finished_at', 'created', 'modified',
+        ]
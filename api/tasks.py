@@ -0,0 +1,53 @@
+import logging
+import uuid
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from .importers import ImportFileError, get_importer
+from .models import ImportFile
+
+logger = logging.getLogger(__name__)
+
+# Segundos hasta reintentar una importación que otro worker tiene bloqueada
+IMPORT_LOCK_RETRY_DELAY = 60
+
+
+def get_import_lock_key(import_file_id):
+    return f'import_file_lock:{import_file_id}'
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def process_import_file(self, import_file_id):
+    """
+    Procesa un ImportFile. Con acks_late el mensaje se confirma al terminar:
+    si el worker muere, la tarea se vuelve a entregar y el importador
+    continúa desde el último lote confirmado.
+
+    Un lock en caché (cache.add, atómico en Redis) impide que dos entregas
+    del mismo mensaje procesen el archivo a la vez. La entrega que no obtiene
+    el lock se reintenta más tarde: si la otra terminó, el ImportFile ya está
+    `done`; si murió sin liberarlo, el lock expira (IMPORT_LOCK_TIMEOUT).
+    """
+    key = get_import_lock_key(import_file_id)
+    token = uuid.uuid4().hex
+    if not cache.add(key, token, timeout=settings.IMPORT_LOCK_TIMEOUT):
+        if self.request.is_eager:
+            # En modo eager retry() se ejecutaría en el acto, en bucle
+            logger.warning('Import file %s is already being processed', import_file_id)
+            return
+        raise self.retry(countdown=IMPORT_LOCK_RETRY_DELAY)
+    try:
+        import_file = ImportFile.objects.filter(pk=import_file_id).first()
+        if import_file is None or import_file.status == 'done':
+            return
+        try:
+            get_importer(import_file).run()
+        except ImportFileError as ex:
+            # Error del archivo: reintentar no cambia el resultado
+            logger.error('Import file %s failed: %s', import_file_id, ex)
+    finally:
+        # Solo se libera el lock propio (el nuestro pudo expirar y ser tomado)
+        if cache.get(key) == token:
+            cache.delete(key)
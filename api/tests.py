@@ -1,3 +1,1021 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+
+from .cache import CONTENT_ENCODINGS, brotli, bump_generation, compress, get_catalogue_version
+from .importers import ImageZipImporter, ProductImporter
+from .management.commands.check_query_plans import Command as CheckQueryPlansCommand
+from .models import Brand, Category, Images, ImportFile, Organization, Product
+from .pagination import KeysetPagination
+from .serializers import CompiledListSerializer
+from .tasks import get_import_lock_key, process_import_file
+from .views import ProductFacetsView, ProductFilter, ProductViewSet
+
+
+class CatalogueTestCase(APITestCase):
+    """
+    Catálogo pequeño: una marca, una categoría y productos con precios
+    repetidos y nulos (para probar desempates y NULL en los órdenes)
+    """
+    prices = ['30.00', '10.00', None, '20.00', '10.00', None, '5.00', '20.00']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Org', slug='org')
+        cls.brand = Brand.objects.create(name='Brand', organization=cls.organization)
+        cls.category = Category.objects.create(name='Category', organization=cls.organization)
+        cls.products = []
+        for index, price in enumerate(cls.prices):
+            product = Product.objects.create(
+                name=f'Product {index:02d}',
+                sku=f'SKU-{index}',
+                organization=cls.organization,
+                brand=cls.brand,
+                price_1=None if price is None else Decimal(price),
+            )
+            product.categories.add(cls.category)
+            cls.products.append(product)
+
+    def setUp(self):
+        cache.clear()
+
+    def sorted_ids(self, field, descending=False):
+        """
+        Ids en el orden esperado: NULL al final y `id` como desempate
+        """
+        present = [product for product in self.products if getattr(product, field) is not None]
+        missing = [product for product in self.products if getattr(product, field) is None]
+        present.sort(key=lambda product: product.pk, reverse=descending)
+        present.sort(key=lambda product: getattr(product, field), reverse=descending)
+        missing.sort(key=lambda product: product.pk, reverse=descending)
+        return [product.pk for product in present + missing]
+
+
+class ProductFieldsTests(CatalogueTestCase):
+
+    def test_ordering_with_fields_without_ordering_column(self):
+        for ordering in ('price_1', '-name'):
+            with self.subTest(ordering=ordering):
+                full = self.client.get('/api/product/', {'ordering': ordering, 'page_size': 100})
+                sparse = self.client.get('/api/product/', {'ordering': ordering, 'fields': 'id'})
+                self.assertEqual(sparse.status_code, 200)
+                self.assertEqual([item['id'] for item in sparse.data['results']],
+                                 [item['id'] for item in full.data['results']])
+                self.assertEqual(set(sparse.data['results'][0]), {'id'})
+
+    def test_cursor_ordering_with_fields(self):
+        response = self.client.get('/api/product/', {'ordering': 'price_1', 'fields': 'id,name', 'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], self.sorted_ids('price_1'))
+
+
+class ProductListQueriesTests(APITestCase):
+    """
+    El número de consultas de un listado no depende del número de productos
+    """
+
+    def create_catalogue(self, size):
+        organization = Organization.objects.create(name=f'Org {size}', slug=f'org-{size}')
+        parent_brand = Brand.objects.create(name='Parent', organization=organization)
+        brand = Brand.objects.create(name='Brand', organization=organization, parent=parent_brand)
+        image = Images.objects.create(name='Image', organization=organization)
+        brand.images.add(image)
+        category = Category.objects.create(name='Category', organization=organization)
+        category.images.add(image)
+        for index in range(size):
+            product = Product.objects.create(name=f'Product {index}', sku=f'{size}-{index}', organization=organization, brand=brand)
+            product.categories.add(category)
+            product.images.add(image)
+            for variation_index in range(2):
+                variation = Product.objects.create(
+                    name=f'Variation {index}-{variation_index}', sku=f'{size}-{index}-{variation_index}',
+                    organization=organization, brand=brand, parent=product)
+                variation.categories.add(category)
+                variation.images.add(image)
+        return organization
+
+    def count_queries(self, organization, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/product/', {'organization': organization.pk, 'page_size': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_constant_queries(self):
+        small, large = self.create_catalogue(3), self.create_catalogue(20)
+        for params in ({}, {'cursor': ''}, {'fields': 'id,name,brand,variations', 'expand': 'brand,variations'},
+                       {'expand': 'categories,images'}):
+            with self.subTest(params=params):
+                expected = self.count_queries(small, params)
+                with self.assertNumQueries(expected):
+                    cache.clear()
+                    response = self.client.get('/api/product/', {'organization': large.pk, 'page_size': 50, **params})
+                self.assertEqual(len(response.data['results']), 20)
+
+
+class KeysetPaginationTests(CatalogueTestCase):
+    orderings = ('name', '-name', 'price_1', '-price_1', 'created', '-created')
+
+    def setUp(self):
+        super().setUp()
+        # Empates en `created` para que el desempate por `id` cruce páginas
+        created = self.products[0].created
+        Product.objects.filter(pk__in=[product.pk for product in self.products[::2]]).update(created=created)
+        for product in self.products:
+            product.refresh_from_db()
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, ordering, page_size):
+        """
+        Recorre todas las páginas hacia adelante y luego, desde la última,
+        hacia atrás. Devuelve los ids de cada recorrido en orden de lista
+        """
+        # El tamaño de página no forma parte de la clave de la caché
+        cache.clear()
+        with mock.patch.object(KeysetPagination, 'page_size', page_size):
+            params = {'cursor': ''} if ordering is None else {'ordering': ordering, 'cursor': ''}
+            pages = [self.get_page('/api/product/', params)]
+            self.assertIsNone(pages[0]['previous'])
+            while pages[-1]['next']:
+                pages.append(self.get_page(pages[-1]['next']))
+            forward = [item['id'] for page in pages for item in page['results']]
+            backward = [item['id'] for item in pages[-1]['results']]
+            page = pages[-1]
+            while page['previous']:
+                page = self.get_page(page['previous'])
+                self.assertLessEqual(len(page['results']), page_size)
+                backward = [item['id'] for item in page['results']] + backward
+            self.assertEqual(len(pages), -(-len(self.products) // page_size))
+        return forward, backward
+
+    def test_forward_and_backward(self):
+        for ordering in self.orderings:
+            expected = self.sorted_ids(ordering.lstrip('-'), descending=ordering.startswith('-'))
+            for page_size in (1, 2, 3, 5):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    forward, backward = self.walk(ordering, page_size)
+                    self.assertEqual(forward, expected)
+                    self.assertEqual(backward, expected)
+
+    def test_default_ordering(self):
+        # Sin ?ordering= se usa el orden por defecto del cursor (-created)
+        forward, backward = self.walk(None, 3)
+        self.assertEqual(forward, self.sorted_ids('created', descending=True))
+        self.assertEqual(backward, forward)
+
+    def test_cursor_from_other_ordering(self):
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            data = self.get_page('/api/product/', {'ordering': 'price_1', 'cursor': ''})
+            url = data['next'].replace('ordering=price_1', 'ordering=name')
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get('/api/product/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class CompiledSerializerTests(CatalogueTestCase):
+    params = (
+        {},
+        {'fields': 'id,name,variations'},
+        {'fields': 'id,name,brand,categories', 'expand': 'brand'},
+        {'expand': 'variations,categories'},
+        {'expand': ''},
+        {'fields': 'id,sku,parent,variations,categories', 'expand': 'variations'},
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.brand.parent = Brand.objects.create(name='Parent brand', organization=cls.organization)
+        cls.brand.save()
+        # Tres niveles de variaciones: el último queda fuera de la precarga
+        parent = cls.products[0]
+        for level in range(3):
+            for index in range(2):
+                variation = Product.objects.create(
+                    name=f'{parent.name} / {index}', sku=f'{parent.sku}-{index}',
+                    organization=cls.organization, brand=cls.brand, parent=parent, price_1=Decimal(index))
+                variation.categories.add(cls.category)
+            parent = variation
+
+    def get_content(self, url, params, compiled):
+        cache.clear()
+        CompiledListSerializer.plans.clear()
+        patch = nullcontext() if compiled else mock.patch.object(
+            CompiledListSerializer, 'to_representation', serializers.ListSerializer.to_representation)
+        with patch:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_output_as_list_serializer(self):
+        urls = ('/api/product/', '/api/product_view/', f'/api/product_view/{self.products[0].pk}/')
+        for url in urls:
+            for params in self.params:
+                with self.subTest(url=url, params=params):
+                    params = {**params, 'ordering': 'name'}
+                    self.assertEqual(self.get_content(url, params, compiled=True),
+                                     self.get_content(url, params, compiled=False))
+
+
+class CacheInvalidationTests(CatalogueTestCase):
+
+    def get_generations(self):
+        return get_catalogue_version(['product', 'category'], self.organization.pk)[0]
+
+    def test_generation_moves_after_commit(self):
+        before = self.get_generations()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product = self.products[0]
+            product.name = 'Renamed'
+            product.save()
+            product.categories.clear()
+            # Hasta confirmar, las lecturas concurrentes siguen con la generación anterior
+            self.assertEqual(self.get_generations(), before)
+        self.assertTrue(callbacks)
+        after = self.get_generations()
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+    def test_cached_list_refreshed_after_commit(self):
+        self.client.get('/api/product/', {'ordering': 'name'})
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.products[0]
+            product.name = 'Renamed'
+            product.save()
+        response = self.client.get('/api/product/', {'ordering': 'name'})
+        self.assertIn('Renamed', [item['name'] for item in response.data['results']])
+
+    def get_product_list(self, **params):
+        response = self.client.get('/api/product/', {'organization': self.organization.pk, 'ordering': 'name', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_shared_and_foreign_objects_invalidate_referencing_organizations(self):
+        other = Organization.objects.create(name='Other', slug='other')
+        unrelated = Organization.objects.create(name='Unrelated', slug='unrelated')
+        shared_brand = Brand.objects.create(name='Shared brand')
+        foreign_category = Category.objects.create(name='Foreign category', organization=other)
+        image = Images.objects.create(name='Shared image')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.products[0].pk).update(brand=shared_brand)
+            self.products[1].categories.add(foreign_category)
+            self.products[2].images.add(image)
+
+        def get_objects():
+            results = {item['id']: item for item in self.get_product_list()}
+            return (results[self.products[0].pk]['brand']['name'],
+                    [category['name'] for category in results[self.products[1].pk]['categories']],
+                    [item['name'] for item in results[self.products[2].pk]['images']])
+
+        self.assertEqual(get_objects(), ('Shared brand', ['Category', 'Foreign category'], ['Shared image']))
+        unrelated_before = get_catalogue_version(['category'], unrelated.pk)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            shared_brand.name = 'Renamed brand'
+            shared_brand.save()
+            foreign_category.name = 'Renamed category'
+            foreign_category.save()
+            image.name = 'Renamed image'
+            image.save()
+        self.assertEqual(get_objects(), ('Renamed brand', ['Category', 'Renamed category'], ['Renamed image']))
+        # La categoría de `other` no la usa ningún producto de `unrelated`
+        self.assertEqual(get_catalogue_version(['category'], unrelated.pk)[0], unrelated_before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            foreign_category.delete()
+        self.assertEqual(get_objects()[1], ['Category'])
+
+    def test_reverse_m2m_invalidates_products(self):
+        image = Images.objects.create(name='Image', organization=Organization.objects.create(name='Other', slug='other'))
+        self.get_product_list()
+        with self.captureOnCommitCallbacks(execute=True):
+            image.product_set.add(self.products[0])
+        results = {item['id']: item for item in self.get_product_list()}
+        self.assertEqual([item['name'] for item in results[self.products[0].pk]['images']], ['Image'])
+
+    def test_etag_revalidation_after_commit(self):
+        first = self.client.get('/api/product/')
+        etag = first['ETag']
+        self.assertEqual(self.client.get('/api/product/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.products[0]
+            product.name = 'Renamed'
+            product.save()
+            # Sin confirmar, el ETag no cambia
+            self.assertEqual(self.client.get('/api/product/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get('/api/product/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', [item['name'] for item in response.data['results']])
+
+
+class SlugTests(CatalogueTestCase):
+
+    def create(self, name, organization=None, **kwargs):
+        return Product.objects.create(name=name, organization=organization or self.organization, **kwargs)
+
+    def test_dedupe_within_organization(self):
+        slugs = [self.create('Mesa').slug, self.create('Mesa').slug, self.create('mesa').slug, self.create('!!!').slug]
+        self.assertEqual(slugs, ['mesa', 'mesa-2', 'mesa-3', 'product'])
+        self.assertEqual(Product.get_unique_slugs(self.organization.pk, ['Mesa', 'Mesa', 'Silla'], reserved={'silla'}),
+                         ['mesa-4', 'mesa-5', 'silla-2'])
+        # Un slug indicado explícitamente se conserva
+        self.assertEqual(self.create('Otra', slug='propio').slug, 'propio')
+
+    def test_same_slug_in_two_organizations(self):
+        other = Organization.objects.create(name='Other', slug='other')
+        first, second = self.create('Mesa'), self.create('Mesa', organization=other)
+        self.assertEqual((first.slug, second.slug), ('mesa', 'mesa'))
+
+        response = self.client.get('/api/product_view/slug/mesa/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('organization', response.data)
+        for product in (first, second):
+            response = self.client.get('/api/product_view/slug/mesa/', {'organization': product.organization_id})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['id'], product.pk)
+        self.assertEqual(self.client.get('/api/product_view/slug/missing/').status_code, 404)
+        self.assertEqual(self.client.get('/api/product_view/slug/mesa/', {'organization': 'abc'}).status_code, 400)
+
+    def test_lookup_by_slug(self):
+        for url, instance in ((f'/api/category/slug/{self.category.slug}/', self.category),
+                              (f'/api/brand/slug/{self.brand.slug}/', self.brand),
+                              (f'/api/product_view/slug/{self.products[0].slug}/', self.products[0])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['id'], instance.pk)
+
+    def test_explicit_slug_collision_is_rejected(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        response = self.client.post('/api/brand/', {'name': 'Copy', 'slug': self.brand.slug, 'organization': self.organization.pk},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['slug'], ['This slug already exists in the organization.'])
+
+    def test_retry_on_concurrent_slug(self):
+        self.create('Mesa')
+        get_unique_slugs = Product.get_unique_slugs
+        calls = []
+
+        def stale_first(*args, **kwargs):
+            # La primera consulta no ve el slug que otro proceso acaba de insertar
+            calls.append(args)
+            return ['mesa'] if len(calls) == 1 else get_unique_slugs(*args, **kwargs)
+
+        with mock.patch.object(Product, 'get_unique_slugs', side_effect=stale_first):
+            product = self.create('Mesa')
+        self.assertEqual((product.slug, len(calls)), ('mesa-2', 2))
+
+        with mock.patch.object(Product, 'get_unique_slugs', return_value=['mesa']):
+            product = Product(name='Mesa', organization=self.organization)
+            with self.assertRaises(IntegrityError):
+                product.save()
+        self.assertIsNone(product.slug)
+
+
+class ProductBatchTests(CatalogueTestCase):
+
+    def batch(self, **params):
+        return self.client.get('/api/product_view/batch/', params)
+
+    def test_request_order(self):
+        first, second, third = self.products[3], self.products[1], self.products[5]
+        response = self.batch(ids=f'{first.pk},{second.pk}', skus=f'SKU-0,{first.sku}', slugs=third.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [first.pk, second.pk, self.products[0].pk, third.pk])
+        self.assertEqual(response.data['missing'], {'ids': [], 'skus': [], 'slugs': []})
+
+    def test_missing_keys(self):
+        response = self.batch(ids=f'999999,{self.products[0].pk}', skus='NOPE', slugs=['nope', self.products[2].slug])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.products[0].pk, self.products[2].pk])
+        self.assertEqual(response.data['missing'], {'ids': [999999], 'skus': ['NOPE'], 'slugs': ['nope']})
+
+    def test_malformed_requests(self):
+        for params in ({'ids': '1,abc'}, {'ids': '-1'}, {}, {'ids': ' , '}, {'organization': 'abc', 'ids': '1'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.batch(**params).status_code, 400)
+        with override_settings(PRODUCT_BATCH_MAX_KEYS=2):
+            self.assertEqual(self.batch(ids='1,2', skus='SKU-0').status_code, 400)
+
+    def test_per_object_cache(self):
+        serialized = []
+        get_serializer = ProductViewSet.get_serializer
+
+        def spy(view, instances=None, *args, **kwargs):
+            serialized.append(sorted(instance.pk for instance in instances))
+            return get_serializer(view, instances, *args, **kwargs)
+
+        first, second, third = self.products[:3]
+        with mock.patch.object(ProductViewSet, 'get_serializer', spy):
+            self.batch(ids=f'{first.pk},{second.pk}')
+            # Solo se serializa el que no estaba en caché
+            response = self.batch(ids=f'{second.pk},{third.pk},{first.pk}')
+            self.assertEqual([item['id'] for item in response.data['results']], [second.pk, third.pk, first.pk])
+            # Otro ?fields= es otra variante
+            response = self.batch(ids=f'{first.pk}', fields='id,sku')
+            self.assertEqual(response.data['results'], [{'id': first.pk, 'sku': first.sku}])
+            # Un cambio en la organización invalida las entradas
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.filter(pk=first.pk).update(name='Renamed')
+                bump_generation('product', self.organization.pk)
+            response = self.batch(ids=f'{first.pk},{second.pk}')
+            self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+        self.assertEqual(serialized, [[first.pk, second.pk], [third.pk], [first.pk], [first.pk, second.pk]])
+
+
+class CompressedResponseTests(CatalogueTestCase):
+
+    def decompress(self, content, encoding):
+        return brotli.decompress(content) if encoding == 'br' else gzip.decompress(content)
+
+    def get(self, url, encoding=None, **params):
+        extra = {'HTTP_ACCEPT_ENCODING': encoding} if encoding else {}
+        response = self.client.get(url, params, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return response
+
+    def test_each_encoding_cached_separately(self):
+        plain = self.get('/api/product/').content
+        self.assertGreater(len(plain), settings.CATALOGUE_COMPRESS_MIN_LENGTH)
+        for encoding in CONTENT_ENCODINGS:
+            with self.subTest(encoding=encoding), mock.patch('api.cache.compress', wraps=compress) as compressed:
+                for attempt in range(2):
+                    response = self.get('/api/product/', encoding)
+                    self.assertEqual(response['Content-Encoding'], encoding)
+                    self.assertEqual(self.decompress(response.content, encoding), plain)
+                # Se comprime una sola vez; el segundo acierto copia los bytes guardados
+                self.assertEqual(compressed.call_count, 1)
+        # La variante sin comprimir no cambia
+        response = self.get('/api/product/', 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, plain)
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        response = self.get('/api/product/', 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_small_responses_not_compressed(self):
+        response = self.get('/api/product/', 'gzip', fields='id')
+        self.assertLess(len(response.content), settings.CATALOGUE_COMPRESS_MIN_LENGTH)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.json()['results']), len(self.products))
+
+    def test_compressed_export(self):
+        plain = b''.join(self.get('/api/product/export.csv').streaming_content)
+        for encoding in CONTENT_ENCODINGS:
+            with self.subTest(encoding=encoding):
+                response = self.get('/api/product/export.csv', encoding)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertEqual(self.decompress(b''.join(response.streaming_content), encoding), plain)
+
+
+class CategoryTreeTests(CatalogueTestCase):
+
+    def test_move_inside_descendant_is_rejected(self):
+        child = Category.objects.create(name='Child', parent=self.category, organization=self.organization)
+        leaf = Category.objects.create(name='Leaf', parent=child, organization=self.organization)
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        for parent in (leaf, child, self.category):
+            with self.subTest(parent=parent.name):
+                response = self.client.patch(f'/api/category/{self.category.pk}/', {'parent': parent.pk}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('parent', response.data)
+        response = self.client.patch(f'/api/category/{leaf.pk}/', {'parent': self.category.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f'{self.category.pk}/{leaf.pk}/')
+
+    def create_subtree(self):
+        child = Category.objects.create(name='Child', parent=self.category, organization=self.organization)
+        leaf = Category.objects.create(name='Leaf', parent=child, organization=self.organization)
+        self.products[1].categories.set([child])
+        self.products[2].categories.set([leaf])
+        return child, leaf
+
+    def descendant_ids(self, category_id):
+        response = self.client.get('/api/product/', {'categories__descendant_of': category_id, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.data['results']}
+
+    def test_descendant_of(self):
+        child, leaf = self.create_subtree()
+        self.assertEqual(self.descendant_ids(self.category.pk), {product.pk for product in self.products})
+        self.assertEqual(self.descendant_ids(child.pk), {self.products[1].pk, self.products[2].pk})
+        self.assertEqual(self.descendant_ids(leaf.pk), {self.products[2].pk})
+        self.assertEqual(self.descendant_ids(999999), set())
+        # Una sola consulta, con la ruta del ancestro en una subconsulta
+        queryset = ProductFilter({'categories__descendant_of': child.pk}, queryset=Product.objects.all()).qs
+        with self.assertNumQueries(1):
+            self.assertEqual(len(queryset), 2)
+
+    def test_subtree_move_rewrites_paths(self):
+        child, leaf = self.create_subtree()
+        other = Category.objects.create(name='Other', organization=self.organization)
+        child.parent = other
+        child.save()
+        child.refresh_from_db()
+        leaf.refresh_from_db()
+        self.assertEqual(child.path, f'{other.pk}/{child.pk}/')
+        self.assertEqual(leaf.path, f'{other.pk}/{child.pk}/{leaf.pk}/')
+        self.assertEqual(self.descendant_ids(other.pk), {self.products[1].pk, self.products[2].pk})
+        self.assertNotIn(self.products[2].pk, self.descendant_ids(self.category.pk))
+        # Al volver a la raíz
+        child.parent = None
+        child.save()
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f'{child.pk}/{leaf.pk}/')
+
+    def test_tree_organization_param(self):
+        response = self.client.get('/api/category/tree/', {'organization': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('organization', response.data)
+        response = self.client.get('/api/category/tree/', {'organization': self.organization.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.category.pk])
+
+
+class ProductSearchTests(CatalogueTestCase):
+
+    def search(self, term, **params):
+        response = self.client.get('/api/product/', {'search': term, 'fields': 'id', **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    @unittest.skipIf(connection.vendor == 'postgresql', 'the icontains fallback is not used on PostgreSQL')
+    def test_icontains_fallback(self):
+        self.assertEqual(self.search('product 03'), [self.products[3].pk])
+        self.assertEqual(self.search('sku-5'), [self.products[5].pk])
+        # Campos relacionados: cada producto una sola vez aunque coincidan varios
+        self.assertEqual(sorted(self.search('BRAND')), sorted(product.pk for product in self.products))
+        self.assertEqual(sorted(self.search('categ')), sorted(product.pk for product in self.products))
+        self.assertEqual(self.search('product 0', ordering='name'), [product.pk for product in self.products])
+        self.assertEqual(self.search('missing'), [])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'full-text search requires PostgreSQL')
+    def test_full_text_search(self):
+        self.assertEqual(self.search('SKU-3'), [self.products[3].pk])
+        self.assertEqual(sorted(self.search('brand')), sorted(product.pk for product in self.products))
+        self.assertEqual(self.search('missing'), [])
+
+
+class ProductSuggestTests(CatalogueTestCase):
+
+    def test_limit(self):
+        response = self.client.get('/api/product/suggest/', {'q': 'Product', 'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        response = self.client.get('/api/product/suggest/', {'q': 'Product', 'limit': 1000})
+        self.assertEqual(len(response.data), len(self.products))
+
+    def test_invalid_params(self):
+        for params in ({'limit': '-1'}, {'limit': '0'}, {'limit': 'abc'}, {'organization': 'abc'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/product/suggest/', {'q': 'Product', **params})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+
+class ProductChangesTests(CatalogueTestCase):
+
+    def test_organization_param(self):
+        response = self.client.get('/api/product/changes/', {'organization': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('organization', response.data)
+        response = self.client.get('/api/product/changes/', {'organization': self.organization.pk})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_limit(self):
+        for limit in ('-1', '0', 'abc', '1.5'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/product/changes/', {'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.data)
+        response = self.client.get('/api/product/changes/', {'limit': 5000})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductFacetsTests(CatalogueTestCase):
+
+    def test_price_buckets(self):
+        response = self.client.get('/api/product/facets/', {'price_buckets': '20,0,10,10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(bucket['min'], bucket['max'], bucket['count']) for bucket in response.data['price']],
+            [('0', '10', 1), ('10', '20', 2), ('20', None, 3)],
+        )
+
+    def test_default_price_buckets(self):
+        response = self.client.get('/api/product/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bucket['min'] for bucket in response.data['price']], ProductFacetsView.default_price_buckets)
+
+    def test_invalid_price_buckets(self):
+        for value in ('NaN,1', 'abc', '1,Infinity', '-inf', ',', ''):
+            with self.subTest(value=value):
+                response = self.client.get('/api/product/facets/', {'price_buckets': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('price_buckets', response.data)
+
+
+class ProductStockTests(CatalogueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        Product.objects.filter(pk=self.products[0].pk).update(manage_stock=True, stock_quantity=2)
+        Product.objects.filter(pk=self.products[1].pk).update(manage_stock=True, stock_quantity=0, stock_status='onbackorder')
+
+    def adjust(self, items):
+        return self.client.post('/api/product_view/stock/', items, format='json')
+
+    def test_floor_and_status(self):
+        response = self.adjust([
+            {'sku': 'SKU-0', 'delta': -2},
+            {'sku': 'SKU-0', 'delta': -1},
+            {'id': self.products[1].pk, 'delta': -1},
+            {'id': self.products[1].pk, 'delta': 3},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual((results[0]['stock_quantity'], results[0]['stock_status']), (0, 'outofstock'))
+        self.assertEqual(results[1]['errors'], {'delta': ['Insufficient stock.']})
+        self.assertEqual(results[2]['errors'], {'delta': ['Insufficient stock.']})
+        self.assertEqual((results[3]['stock_quantity'], results[3]['stock_status']), (3, 'instock'))
+
+    def test_unmanaged_product_is_rejected(self):
+        unmanaged = self.products[2]
+        response = self.adjust([{'id': unmanaged.pk, 'delta': -100}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['errors'], {'delta': ['Stock is not managed for this product.']})
+        refreshed = Product.objects.get(pk=unmanaged.pk)
+        self.assertEqual((refreshed.stock_quantity, refreshed.stock_status), (unmanaged.stock_quantity, unmanaged.stock_status))
+
+
+    def test_stock_read_in_update_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.adjust([{'sku': 'SKU-0', 'delta': 3}])
+        self.assertEqual(response.data['results'][0]['stock_quantity'], 5)
+        statements = [query['sql'].split()[0].upper() for query in queries]
+        # SAVEPOINT, UPDATE, lectura del stock y RELEASE, sin nada entre medio
+        update = statements.index('UPDATE')
+        self.assertEqual(statements[update - 1:update + 3], ['SAVEPOINT', 'UPDATE', 'SELECT', 'RELEASE'])
+
+class ProductBulkTests(CatalogueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def bulk(self, method, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)('/api/product_view/bulk/', items, format='json')
+
+    def test_create_partial_failure(self):
+        item = {'organization': self.organization.pk, 'brand': self.brand.pk, 'categories': [self.category.pk]}
+        response = self.bulk('post', [
+            {**item, 'name': 'New 1', 'sku': 'NEW-1', 'price_1': '12.50'},
+            {**item, 'name': 'Existing', 'sku': 'SKU-0'},
+            {**item, 'name': 'New 1 again', 'sku': 'NEW-1'},
+            {**item, 'name': 'Bad price', 'sku': 'NEW-2', 'price_1': 'abc'},
+            {**item, 'name': 'New 3', 'sku': 'NEW-3'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'error', 'created'])
+        self.assertIn('sku', results[1]['errors'])
+        self.assertEqual(results[2]['errors'], {'sku': ['Duplicated in the batch.']})
+        self.assertIn('price_1', results[3]['errors'])
+        product = Product.objects.get(sku='NEW-1')
+        self.assertEqual((product.pk, product.name, product.price_1), (results[0]['id'], 'New 1', Decimal('12.50')))
+        self.assertTrue(product.slug)
+        self.assertEqual(list(product.categories.all()), [self.category])
+        self.assertFalse(Product.objects.filter(sku='NEW-2').exists())
+
+    def test_create_validates_against_prefetched_objects(self):
+        item = {'organization': self.organization.pk, 'brand': self.brand.pk}
+        response = self.bulk('post', [
+            {**item, 'name': 'Bad brand', 'brand': 9999},
+            {**item, 'name': 'Bad category', 'categories': [self.category.pk, 'x']},
+            {**item, 'name': 'Taken slug', 'slug': self.products[0].slug},
+            {**item, 'name': 'Bad organization', 'organization': 9999},
+            {**item, 'name': 'Ok', 'sku': 'NEW-1', 'slug': 'ok', 'categories': [str(self.category.pk)]},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual(results[0]['errors'], {'brand': ['Invalid pk "9999" - object does not exist.']})
+        self.assertEqual(results[1]['errors'], {'categories': ['Incorrect type. Expected pk value, received str.']})
+        self.assertEqual(results[2]['errors'], {'slug': ['This slug already exists in the organization.']})
+        self.assertIn('organization', results[3]['errors'])
+        self.assertEqual(results[4]['status'], 'created')
+        self.assertEqual(list(Product.objects.get(sku='NEW-1').categories.all()), [self.category])
+
+    def test_create_queries_do_not_grow_with_items(self):
+        def count_queries(size, prefix):
+            items = [{'name': f'{prefix} {index}', 'sku': f'{prefix}-{index}', 'organization': self.organization.pk,
+                      'brand': self.brand.pk, 'categories': [self.category.pk]} for index in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.bulk('post', items)
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        self.assertEqual(count_queries(3, 'A'), count_queries(20, 'B'))
+
+    def test_all_failed(self):
+        response = self.bulk('patch', [{'sku': 'MISSING', 'price_1': '1'}, {'price_1': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['errors'], {'sku': ['Not found.']})
+        self.assertIn('non_field_errors', response.data['results'][1]['errors'])
+        response = self.bulk('post', [])
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_partial_failure(self):
+        first, second, third = self.products[:3]
+        response = self.bulk('patch', [
+            {'id': first.pk, 'price_1': '99.00'},
+            {'sku': second.sku, 'stock_quantity': 7},
+            {'id': third.pk, 'price_1': None},
+            {'sku': 'MISSING', 'price_1': '1'},
+            {'id': first.pk},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['updated', 'updated', 'unchanged', 'error', 'error'])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.price_1, second.stock_quantity), (Decimal('99.00'), 7))
+
+    def test_cache_invalidation(self):
+        params = {'ordering': 'name', 'fields': 'id,price_1'}
+        self.client.get('/api/product/', params)
+        before = get_catalogue_version(['product'], self.organization.pk)[0]
+        # Si no cambia nada no se invalida
+        self.bulk('patch', [{'id': self.products[0].pk, 'price_1': '30.00'}])
+        self.assertEqual(get_catalogue_version(['product'], self.organization.pk)[0], before)
+        self.bulk('patch', [{'id': self.products[0].pk, 'price_1': '31.00'}])
+        self.assertNotEqual(get_catalogue_version(['product'], self.organization.pk)[0], before)
+        response = self.client.get('/api/product/', params)
+        prices = {item['id']: item['price_1'] for item in response.json()['results']}
+        self.assertEqual(prices[self.products[0].pk], '31.00')
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(None)
+        response = self.client.patch('/api/product_view/bulk/', [{'id': self.products[0].pk, 'price_1': '1'}], format='json')
+        self.assertIn(response.status_code, (401, 403))
+
+
+class ProductExportTests(CatalogueTestCase):
+
+    def export(self, export_format, **extra):
+        response = self.client.get(f'/api/product/export.{export_format}', **extra)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_accept_header_is_ignored(self):
+        for accept in ('text/csv', 'application/x-ndjson', 'application/json', '*/*'):
+            with self.subTest(accept=accept):
+                self.assertIn('SKU-0', self.export('csv', HTTP_ACCEPT=accept))
+                self.assertIn('SKU-0', self.export('ndjson', HTTP_ACCEPT=accept))
+
+    def test_nested_variations(self):
+        parent = self.products[0]
+        child = Product.objects.create(name='Child', sku='SKU-0-A', organization=self.organization, parent=parent)
+        grandchild = Product.objects.create(name='Grandchild', sku='SKU-0-A-1', organization=self.organization, parent=child)
+        Product.objects.create(name='Great', sku='SKU-0-A-1-X', organization=self.organization, parent=grandchild)
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        skus = [row['sku'] for row in rows]
+        self.assertEqual(skus[:4], ['SKU-0', 'SKU-0-A', 'SKU-0-A-1', 'SKU-0-A-1-X'])
+        self.assertEqual([row['parent_sku'] for row in rows[:4]], [None, 'SKU-0', 'SKU-0-A', 'SKU-0-A-1'])
+        self.assertEqual(len(skus), len(set(skus)))
+
+
+class ProductImporterTests(CatalogueTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+
+    def run_import(self, lines, batch_size=None, **kwargs):
+        import_file = ImportFile.objects.create(
+            file=ContentFile('\n'.join(lines).encode('utf-8'), name='products.csv'),
+            organization=self.organization,
+            uploaded=True,
+            **kwargs,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImporter(import_file, batch_size=batch_size).run()
+        import_file.refresh_from_db()
+        return import_file
+
+    def assertCounters(self, import_file, read, processed, failed):
+        self.assertEqual(
+            (import_file.rows_read, import_file.rows_processed, import_file.rows_failed), (read, processed, failed))
+        self.assertEqual(import_file.rows_read, import_file.rows_processed + import_file.rows_failed)
+
+    def test_duplicate_sku_in_file(self):
+        import_file = self.run_import([
+            'sku,name,price_1',
+            'NEW-1,First,10',
+            'NEW-2,Other,5',
+            'NEW-1,Second,20',
+        ])
+        self.assertCounters(import_file, 3, 2, 1)
+        self.assertEqual(import_file.errors, [
+            {'line': 4, 'sku': 'NEW-1', 'error': 'duplicate sku in the file, only its first row is imported'},
+        ])
+        product = Product.objects.get(sku='NEW-1')
+        self.assertEqual((product.name, product.price_1), ('First', Decimal('10.00')))
+
+    def test_duplicate_sku_across_batches(self):
+        lines = ['sku,name'] + [f'NEW-{index},Product {index}' for index in range(5)] + ['NEW-0,Again']
+        import_file = self.run_import(lines, batch_size=2)
+        self.assertCounters(import_file, 6, 5, 1)
+        self.assertEqual(Product.objects.get(sku='NEW-0').name, 'Product 0')
+
+    def test_duplicate_sku_after_resume(self):
+        # Interrumpida tras confirmar las dos primeras filas
+        import_file = self.run_import(['sku,name', 'NEW-1,First', 'NEW-2,Second'])
+        import_file.file.save('products.csv', ContentFile(b'sku,name\nNEW-1,First\nNEW-2,Second\nNEW-1,Again\nNEW-3,Third'))
+        ImportFile.objects.filter(pk=import_file.pk).update(status='processing')
+        import_file.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImporter(import_file).run()
+        import_file.refresh_from_db()
+        self.assertCounters(import_file, 4, 3, 1)
+        self.assertEqual(Product.objects.get(sku='NEW-1').name, 'First')
+
+    def test_invalid_values_report_column_and_value(self):
+        import_file = self.run_import([
+            'sku,name,price_1,weight,stock_quantity',
+            'NEW-1,Price,abc,,',
+            'NEW-2,Weight,1,NaN,',
+            'NEW-3,Stock,1,,many',
+            'NEW-4,Large,1e20,,',
+            'NEW-5,Valid,"1.234,50",2,3',
+        ])
+        self.assertCounters(import_file, 5, 1, 4)
+        self.assertEqual([error['error'] for error in import_file.errors], [
+            'invalid price_1 "abc"',
+            'invalid weight "NaN"',
+            'invalid stock_quantity "many"',
+            'invalid price_1 "1e20"',
+        ])
+        self.assertEqual(Product.objects.get(sku='NEW-5').price_1, Decimal('1234.50'))
+
+    def test_reimport_diff(self):
+        self.run_import(['sku,name,price_1', 'NEW-1,First,10', 'NEW-2,Second,20', 'NEW-3,Third,30'])
+        # Un cambio hecho fuera de la importación no se pisa con una fila igual
+        Product.objects.filter(sku='NEW-2').update(name='Edited')
+        import_file = self.run_import(['sku,name,price_1', 'NEW-1,First,10', 'NEW-2,Second,20', 'NEW-3,Third,35'])
+        self.assertCounters(import_file, 3, 3, 0)
+        self.assertEqual(import_file.rows_skipped, 2)
+        products = {product.sku: product for product in Product.objects.filter(sku__startswith='NEW-')}
+        self.assertEqual(products['NEW-2'].name, 'Edited')
+        self.assertEqual((products['NEW-3'].name, products['NEW-3'].price_1), ('Third', Decimal('35.00')))
+
+    def test_concurrent_insert_is_retried(self):
+        assign_slugs = ProductImporter.assign_slugs
+        other = Organization.objects.create(name='Other', slug='other')
+
+        def concurrent_import(importer, products):
+            # Otra importación crea los mismos sku después de la lectura del lote
+            if not Product.objects.filter(sku='NEW-1').exists():
+                Product.objects.create(name='Concurrent', sku='NEW-1', organization=self.organization)
+                Product.objects.create(name='Foreign', sku='NEW-2', organization=other)
+            return assign_slugs(importer, products)
+
+        with mock.patch.object(ProductImporter, 'assign_slugs', concurrent_import), \
+                self.assertLogs('api.importers', 'WARNING'):
+            import_file = self.run_import(['sku,name', 'NEW-1,First', 'NEW-2,Second', 'NEW-3,Third'])
+        self.assertCounters(import_file, 3, 2, 1)
+        self.assertEqual(import_file.errors, [{'line': None, 'sku': 'NEW-2', 'error': 'sku belongs to another organization'}])
+        self.assertEqual(Product.objects.get(sku='NEW-1').name, 'First')
+        self.assertEqual(Product.objects.get(sku='NEW-2').name, 'Foreign')
+        self.assertTrue(Product.objects.filter(sku='NEW-3', organization=self.organization).exists())
+
+    def make_images_zip(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as images:
+            for index, name in enumerate(('SKU-0.png', 'SKU-1_2.png', 'SKU-3.png')):
+                content = io.BytesIO()
+                Image.new('RGB', (40 + index, 30), (index * 60, 0, 0)).save(content, 'PNG')
+                images.writestr(name, content.getvalue())
+            images.writestr('SKU-2.png', b'not an image')
+        return ContentFile(archive.getvalue(), name='images.zip')
+
+    def test_images_zip_pool(self):
+        # Proceso normal: pool de procesos; worker daemon (prefork): pool de hilos
+        for daemon, executor_class in ((False, ProcessPoolExecutor), (True, ThreadPoolExecutor)):
+            with self.subTest(daemon=daemon):
+                Images.objects.all().delete()
+                Product.images.through.objects.all().delete()
+                executors = []
+                get_executor = ImageZipImporter.get_executor
+
+                def spy(importer):
+                    executors.append(get_executor(importer))
+                    return executors[-1]
+
+                with mock.patch('api.importers.multiprocessing.current_process', return_value=mock.Mock(daemon=daemon)), \
+                        mock.patch.object(ImageZipImporter, 'get_executor', spy), \
+                        override_settings(IMPORT_IMAGE_WORKERS=2):
+                    import_file = self.run_import(['sku,name', 'SKU-0,Product 00'], images_zip=self.make_images_zip())
+                self.assertIsInstance(executors[0], executor_class)
+                self.assertEqual(import_file.status, 'done')
+                # La imagen inválida no es una fila del archivo
+                self.assertCounters(import_file, 1, 1, 0)
+                self.assertEqual(import_file.images_failed, 1)
+                self.assertEqual([error['sku'] for error in import_file.errors], ['SKU-2'])
+                self.assertEqual(Images.objects.count(), 3)
+                self.assertEqual(self.products[0].images.count(), 1)
+                self.assertEqual(self.products[1].images.count(), 1)
+
+    def test_remove_all(self):
+        import_file = self.run_import(['sku,name', 'SKU-0,Kept', 'NEW-1,New'], remove_all=True)
+        self.assertEqual(import_file.errors, [])
+        self.assertEqual(
+            set(Product.objects.filter(organization=self.organization).values_list('sku', flat=True)), {'SKU-0', 'NEW-1'})
+
+    def test_remove_all_skipped_without_valid_rows(self):
+        for lines in (['sku,name'], [], ['sku,name', ',Missing sku']):
+            with self.subTest(lines=lines):
+                import_file = self.run_import(lines, remove_all=True)
+                self.assertEqual(import_file.status, 'done')
+                self.assertTrue(import_file.errors[-1]['error'].startswith('remove_all skipped: '))
+                self.assertEqual(Product.objects.filter(organization=self.organization).count(), len(self.products))
+
+    def test_remove_all_skipped_when_a_row_fails(self):
+        import_file = self.run_import(['sku,name,price_1', 'SKU-0,Kept,1', 'NEW-1,Bad,abc'], remove_all=True)
+        self.assertEqual(import_file.errors[-1]['error'], 'remove_all skipped: 1 row(s) failed')
+        self.assertEqual(Product.objects.filter(organization=self.organization).count(), len(self.products))
+
+    def test_task_skips_locked_import(self):
+        import_file = ImportFile.objects.create(organization=self.organization, uploaded=True)
+        import_file.file.save('products.csv', ContentFile(b'sku,name\nNEW-1,New'))
+        # Otra entrega del mismo mensaje ya la está procesando
+        cache.add(get_import_lock_key(import_file.pk), 'other')
+        with self.assertLogs('api.tasks', 'WARNING'):
+            process_import_file.apply(args=[import_file.pk])
+        import_file.refresh_from_db()
+        self.assertNotEqual(import_file.status, 'done')
+        self.assertFalse(Product.objects.filter(sku='NEW-1').exists())
+
+        cache.delete(get_import_lock_key(import_file.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            process_import_file.apply(args=[import_file.pk])
+        import_file.refresh_from_db()
+        self.assertEqual(import_file.status, 'done')
+        self.assertTrue(Product.objects.filter(sku='NEW-1').exists())
+        self.assertIsNone(cache.get(get_import_lock_key(import_file.pk)))
+
+
+class QueryPlansTests(CatalogueTestCase):
+
+    def check_query_plans(self, *args):
+        out = io.StringIO()
+        call_command('check_query_plans', *args, stdout=out)
+        return out.getvalue()
+
+    def test_small_tables_do_not_fail(self):
+        output = self.check_query_plans()
+        statuses = [line.split()[0] for line in output.splitlines() if not line.startswith(' ')]
+        self.assertEqual(len(statuses), len(CheckQueryPlansCommand().get_shapes()))
+        self.assertNotIn('FAIL', statuses)
+        self.assertIn('OK', statuses)
+
+    def test_plan_without_index(self):
+        # Plan que recorre la tabla y ordena aparte en cualquier motor
+        plan = 'SCAN table\nUSE TEMP B-TREE FOR ORDER BY\nSort (cost=1.00..1.01)'
+        with mock.patch.object(CheckQueryPlansCommand, 'explain', return_value=plan):
+            self.assertIn('WARN  product:', self.check_query_plans())
+            with self.assertRaisesMessage(CommandError, 'product, '):
+                self.check_query_plans('--min-rows', '0')
@@ -8,6 +8,7 @@ router.register(r'category', views.CategoryViewSet, basename='category')
 router.register(r'product_view', views.ProductViewSet, basename='product')
 router.register(r'brand', views.BrandViewSet, basename='brand')
 router.register(r'slide', views.SlideViewSet, basename='slide')
+router.register(r'import_file', views.ImportFileViewSet, basename='import_file')
 
 # URLs personalizadas
 urlpatterns = [
@@ -16,6 +17,10 @@ urlpatterns = [
     
     # Otras URLs personalizadas
     path('product/', views.ProductView.as_view(), name='product'),
+    path('product/facets/', views.ProductFacetsView.as_view(), name='product-facets'),
+    path('product/suggest/', views.ProductSuggestView.as_view(), name='product-suggest'),
+    path('product/changes/', views.ProductChangesView.as_view(), name='product-changes'),
+    re_path(r'^product/export\.(?P<export_format>csv|ndjson)$', views.ProductExportView.as_view(), name='product-export'),
     
     # Ruta de ejemplo protegida por JWT
     path('example/', views.ExampleView.as_view(), name='example'),
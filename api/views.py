@@ -1,9 +1,31 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
 import django_filters
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, F, IntegerField, Q, Subquery, Value, When
+from django.db.models.functions import Upper
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status, permissions
+from rest_framework import exceptions, filters, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import viewsets, generics
+from rest_framework.decorators import action
+from .cache import (
+    CachedResponseMixin, ConditionalGetMixin, compress_stream, get_catalogue_version, get_content_encoding,
+)
+from .exporters import ProductExporter
+from .pagination import CatalogPagination
 from .serializers import *
 from .models import *
 
@@ -20,39 +42,269 @@ class ExampleView(APIView):
         return Response(content)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def get_organization_param(request):
+    """
+    ?organization=<id> como entero; None si no se indicó. Un valor no
+    numérico es un error 400 (filtrar con él daría un error de la base)
+    """
+    organization = request.query_params.get('organization')
+    if not organization:
+        return None
+    if not organization.isdigit():
+        raise exceptions.ValidationError({'organization': 'A valid integer is required.'})
+    return int(organization)
+
+
+def get_limit_param(request, default, maximum):
+    """
+    ?limit=<n> como entero positivo, reducido a `maximum`; `default` si no se
+    indicó. Cualquier otro valor es un error 400
+    """
+    limit = request.query_params.get('limit')
+    if limit is None or limit == '':
+        return default
+    if not limit.isdigit() or int(limit) < 1:
+        raise exceptions.ValidationError({'limit': 'Ensure this value is a positive integer.'})
+    return min(int(limit), maximum)
+
+
+class SlugLookupMixin:
+    """
+    Detalle por slug en /<recurso>/slug/<slug>/, resuelto con el índice
+    único (slug, organization). Si el slug existe en varias organizaciones
+    hay que indicar ?organization=<id>.
+    """
+    @action(detail=False, methods=['get'], url_path=r'slug/(?P<slug>[-\w]+)', url_name='slug')
+    def by_slug(self, request, slug=None):
+        queryset = self.get_queryset().filter(slug=slug)
+        organization = get_organization_param(request)
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+        instances = list(queryset[:2])
+        if not instances:
+            raise exceptions.NotFound()
+        if len(instances) > 1:
+            raise exceptions.ValidationError({'organization': 'The slug exists in several organizations.'})
+        self.check_object_permissions(request, instances[0])
+        serializer = self.get_serializer(instances[0])
+        return Response(serializer.data)
+
+
+class CategoryViewSet(SlugLookupMixin, ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.filter(virtual=False)
     serializer_class = CategorySerializer
+    cache_tags = ('category', 'images')
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     search_fields = ['name', 'description', 'style', 'state']
-    filterset_fields = ['state', 'parent']
+    filterset_fields = ['state', 'parent', 'organization']
     ordering_fields = ['order', 'name', 'created']
     ordering = ['order', 'name']
 
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Árbol completo de categorías no virtuales armado con una sola consulta.
+        Acepta ?organization=<id> y ?lite=true para usar CategoryLiteSerializer.
+        """
+        queryset = self.get_queryset()
+        organization = get_organization_param(request)
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+        queryset = filters.OrderingFilter().filter_queryset(request, queryset, self)
+
+        if request.query_params.get('lite', '').lower() in ['1', 'true', 'yes']:
+            serializer_class = CategoryLiteSerializer
+            queryset = queryset.only('id', 'name', 'parent')
+        else:
+            serializer_class = CategorySerializer
+            queryset = queryset.prefetch_related('images')
 
-class ProductViewSet(viewsets.ModelViewSet):
+        roots, childs_map = build_category_tree(queryset)
+        context = self.get_serializer_context()
+        context['category_childs'] = childs_map
+        serializer = serializer_class(roots, many=True, context=context)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """
+        Migas de pan de la categoría, desde la raíz hasta ella misma
+        """
+        category = self.get_object()
+        serializer = CategoryBasicSerializer(category.get_ancestors(include_self=True), many=True)
+        return Response(serializer.data)
+
+
+class ProductViewSet(SlugLookupMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.filter(parent=None, virtual=False)
     serializer_class = ProductSerializer
+    cache_tags = ('product', 'brand', 'category', 'images')
+    pagination_class = CatalogPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     search_fields = ['name', 'sku', 'description', 'short_description']
-    filterset_fields = ['state', 'brand', 'categories']
+    filterset_fields = ['state', 'brand', 'categories', 'organization']
     ordering_fields = ['name', 'price_1', 'created']
     ordering = ['name']
 
+    def get_queryset(self):
+        # Solo las columnas y relaciones de ?fields= / ?expand=
+        fields, expand = ProductSerializer.get_sparse_fieldset({'request': self.request})
+        return ProductSerializer.setup_eager_loading(super().get_queryset(), fields=fields, expand=expand)
+
+    # Parámetros de batch y campo por el que se resuelve cada uno
+    batch_keys = (('ids', 'id'), ('skus', 'sku'), ('slugs', 'slug'))
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Varios productos por ?ids=, ?skus= y/o ?slugs= (separados por comas,
+        hasta PRODUCT_BATCH_MAX_KEYS en total), sin paginar. Cada tipo de
+        clave se resuelve con una consulta IN sobre su índice y los
+        productos salen en el orden pedido (ids, luego skus y luego slugs),
+        una vez cada uno; las claves sin producto se listan en `missing`.
+        Sin ?organization=, un slug de varias organizaciones no se resuelve.
+        Acepta ?fields= y ?expand=.
+        """
+        keys = self.get_batch_keys(request)
+        queryset = self.queryset.order_by()
+        organization = get_organization_param(request)
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+
+        # (parámetro, valor) -> id, y organización de cada producto
+        resolved, organizations = {}, {}
+        for param, field in self.batch_keys:
+            if not keys[param]:
+                continue
+            matches = {}
+            for row in queryset.filter(**{f'{field}__in': keys[param]}).values('id', 'organization_id', field):
+                matches.setdefault(row[field], []).append(row['id'])
+                organizations[row['id']] = row['organization_id']
+            for value, ids in matches.items():
+                if len(ids) == 1:
+                    resolved[param, value] = ids[0]
+
+        data = self.get_batch_data(request, list(dict.fromkeys(resolved.values())), organizations)
+        results, seen = [], set()
+        missing = {param: [] for param, field in self.batch_keys}
+        for param, field in self.batch_keys:
+            for value in keys[param]:
+                pk = resolved.get((param, value))
+                if pk not in data:
+                    missing[param].append(value)
+                elif pk not in seen:
+                    seen.add(pk)
+                    results.append(data[pk])
+        return Response({'results': results, 'missing': missing})
 
-class BrandViewSet(viewsets.ModelViewSet):
+    def get_batch_keys(self, request):
+        keys = {}
+        for param, field in self.batch_keys:
+            values = [value.strip() for raw in request.query_params.getlist(param)
+                      for value in raw.split(',') if value.strip()]
+            keys[param] = list(dict.fromkeys(values))
+        if not all(value.isdigit() for value in keys['ids']):
+            raise exceptions.ValidationError({'ids': 'A valid integer is required.'})
+        keys['ids'] = list(dict.fromkeys(int(value) for value in keys['ids']))
+        total = sum(len(values) for values in keys.values())
+        if not total:
+            raise exceptions.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: 'Expected at least one of ids, skus or slugs.'})
+        if total > settings.PRODUCT_BATCH_MAX_KEYS:
+            raise exceptions.ValidationError({api_settings.NON_FIELD_ERRORS_KEY:
+                                              f'Ensure there are no more than {settings.PRODUCT_BATCH_MAX_KEYS} keys.'})
+        return keys
+
+    def get_batch_data(self, request, ids, organizations):
+        """
+        Representación de cada producto {id: datos}. Cada producto se guarda
+        en caché por separado, con una clave que incluye las generaciones
+        de `cache_tags` de su organización y lo que cambia la salida
+        (?fields=, ?expand=, host): las claves repetidas entre peticiones no
+        se consultan ni serializan de nuevo. Los que faltan se leen con una
+        consulta (get_queryset, con sus precargas) y se serializan juntos.
+        """
+        if not ids:
+            return {}
+        fields, expand = ProductSerializer.get_sparse_fieldset({'request': request})
+        variant = repr((sorted(fields or ()), fields is None, sorted(expand or ()), expand is None,
+                        request.get_host(), request.scheme))
+        generations = {
+            organization: get_catalogue_version(self.cache_tags, organization)[0]
+            for organization in {organizations[pk] for pk in ids}
+        }
+        cache_keys = {}
+        for pk in ids:
+            digest = hashlib.md5(repr((generations[organizations[pk]], variant)).encode('utf-8')).hexdigest()
+            cache_keys[pk] = f'catalogue:object:product:{pk}:{digest}'
+        cached = cache.get_many(list(cache_keys.values()))
+        data = {pk: cached[key] for pk, key in cache_keys.items() if key in cached}
+
+        pending = [pk for pk in ids if pk not in data]
+        if pending:
+            instances = list(self.get_queryset().filter(pk__in=pending))
+            serializer = self.get_serializer(instances, many=True)
+            fresh = {instance.pk: item for instance, item in zip(instances, serializer.data)}
+            cache.set_many({cache_keys[pk]: item for pk, item in fresh.items()}, settings.CATALOGUE_CACHE_TIMEOUT)
+            data.update(fresh)
+        return data
+
+    @action(detail=False, methods=['post', 'patch'], permission_classes=[permissions.IsAdminUser])
+    def bulk(self, request):
+        """
+        Alta (POST, mismos campos que la creación individual) o cambio de
+        precio y stock (PATCH, por id o sku) de una lista de productos en
+        una transacción. Responde un resultado por elemento; 207 si alguno
+        falló y 400 si fallaron todos.
+        """
+        context = self.get_serializer_context()
+        if request.method == 'POST':
+            serializer = ProductBulkCreateSerializer(child=ProductSerializer(), data=request.data, context=context)
+            success = status.HTTP_201_CREATED
+        else:
+            serializer = ProductPatchSerializer(data=request.data, many=True, context=context)
+            success = status.HTTP_200_OK
+        return self.bulk_response(serializer.apply(), success)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def stock(self, request):
+        """
+        Suma o resta stock a una lista de productos: [{"id" o "sku", "delta"}].
+        Cada elemento se aplica con un UPDATE atómico sobre la fila, sin
+        lectura previa. Solo se ajustan productos con manage_stock (los demás
+        fallan con 'Stock is not managed for this product.') y el stock nunca
+        queda bajo cero (la resta falla con 'Insufficient stock.'). Responde
+        un resultado por elemento con el stock resultante; 207 si alguno
+        falló y 400 si fallaron todos.
+        """
+        serializer = StockAdjustSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        return self.bulk_response(serializer.apply(), status.HTTP_200_OK)
+
+    def bulk_response(self, results, success):
+        failed = sum(result['status'] == 'error' for result in results)
+        if failed == len(results):
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = success
+        return Response({'results': results}, status=response_status)
+
+
+class BrandViewSet(SlugLookupMixin, ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.filter(parent=None)
     serializer_class = BrandSerializer
+    cache_tags = ('brand', 'images')
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     search_fields = ['name', 'description']
-    filterset_fields = ['state']
+    filterset_fields = ['state', 'organization']
     ordering_fields = ['order', 'name']
     ordering = ['order', 'name']
 
 
-class SlideViewSet(viewsets.ModelViewSet):
+class SlideViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Slide.objects.filter(parent=None)
     serializer_class = SlideSerializer
+    cache_tags = ('slide', 'images')
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     search_fields = ['name', 'description']
     filterset_fields = ['state', 'virtual', 'organization']
@@ -60,21 +312,316 @@ class SlideViewSet(viewsets.ModelViewSet):
     ordering = ['order', 'name']
 
 
+class ImportFileViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Estado y progreso de las importaciones de productos
+    """
+    queryset = ImportFile.objects.all()
+    serializer_class = ImportFileStatusSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'uploaded', 'organization']
+    ordering_fields = ['created', 'started_at', 'finished_at']
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """
+        Vuelve a encolar una importación no terminada; continúa desde el
+        último lote confirmado
+        """
+        from .tasks import process_import_file
+        import_file = self.get_object()
+        if import_file.status == 'done':
+            return Response({'detail': 'Import already finished'}, status=status.HTTP_400_BAD_REQUEST)
+        process_import_file.delay(import_file.pk)
+        import_file.refresh_from_db()
+        serializer = self.get_serializer(import_file)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
 class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
     pass
 
 
 class ProductFilter(django_filters.FilterSet):
     id_in = NumberInFilter(field_name='id', lookup_expr='in')
+    categories__descendant_of = django_filters.NumberFilter(method='filter_descendant_of')
 
     class Meta:
         model = Product
-        fields = ['id_in', 'categories__name', 'categories__id', 'brand__name', 'brand__id']
+        fields = ['id_in', 'categories__name', 'categories__id', 'brand__name', 'brand__id', 'categories__descendant_of',
+                  'organization']
+
+    def filter_descendant_of(self, queryset, name, value):
+        """
+        Productos de la categoría y de todas sus subcategorías, usando el
+        prefijo de la ruta materializada. La ruta de la categoría se lee en
+        una subconsulta, así que el filtro es una sola consulta; si no existe
+        (o no tiene ruta) la subconsulta es NULL y no coincide nada.
+        """
+        path = Category.objects.filter(pk=value).exclude(path='').values('path')[:1]
+        links = Product.categories.through.objects.filter(category__path__startswith=Subquery(path))
+        return queryset.filter(pk__in=links.values('product_id'))
 
 
-class ProductView(generics.ListAPIView):
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Búsqueda de texto completo sobre Product.search_vector (índice GIN) en
+    PostgreSQL, ordenada por relevancia salvo que se pida ?ordering=.
+    En otros motores se usa el SearchFilter de DRF (icontains).
+    """
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+        query = SearchQuery(terms, config=SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.annotate(search_rank=SearchRank(F('search_vector'), query)).order_by('-search_rank', 'id')
+        return queryset
+
+
+class ProductView(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     queryset = Product.objects.filter(parent=None, virtual=False)
     serializer_class = ProductSerializer
-    filter_backends = (filters.SearchFilter, filters.OrderingFilter, django_filters.rest_framework.DjangoFilterBackend)
+    cache_tags = ('product', 'brand', 'category', 'images')
+    pagination_class = CatalogPagination
+    filter_backends = (ProductSearchFilter, filters.OrderingFilter, django_filters.rest_framework.DjangoFilterBackend)
     search_fields = ('name', 'sku', 'slug', 'description', 'id', 'categories__name', 'brand__name')
-    filter_class = ProductFilter
+    filterset_class = ProductFilter
+    # Explícitos: sin ellos OrderingFilter los toma del serializer, que con ?fields= puede no incluirlos
+    ordering_fields = ['name', 'price_1', 'created']
+
+    def get_queryset(self):
+        # Solo las columnas y relaciones de ?fields= / ?expand=
+        fields, expand = ProductSerializer.get_sparse_fieldset({'request': self.request})
+        return ProductSerializer.setup_eager_loading(super().get_queryset(), fields=fields, expand=expand)
+
+
+class ProductFacetsView(ProductView):
+    """
+    Conteos por marca, categoría, estado de stock, moneda y rango de precio
+    para los mismos filtros y búsqueda de ProductView, en una sola respuesta.
+    Los límites de los rangos de precio se pasan con ?price_buckets=0,10000,50000
+    """
+    pagination_class = None
+    default_price_buckets = ['0', '10000', '50000', '100000', '500000']
+
+    def get_queryset(self):
+        return Product.objects.filter(parent=None, virtual=False)
+
+    def get_price_buckets(self, request):
+        """
+        Límites de ?price_buckets= ordenados y sin repetir; los por defecto
+        solo si no se indicó el parámetro. Un límite que no sea un número
+        finito es un error 400.
+        """
+        raw = request.query_params.get('price_buckets')
+        if raw is None:
+            return [Decimal(value) for value in self.default_price_buckets]
+        buckets = set()
+        for value in raw.split(','):
+            value = value.strip()
+            if not value:
+                continue
+            try:
+                bound = Decimal(value)
+            except InvalidOperation:
+                bound = None
+            if bound is None or not bound.is_finite():
+                raise exceptions.ValidationError({'price_buckets': f'"{value}" is not a valid number.'})
+            buckets.add(bound)
+        if not buckets:
+            raise exceptions.ValidationError({'price_buckets': 'Expected a comma-separated list of numbers.'})
+        return sorted(buckets)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        products = Product.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+        # Facetas de dominio fijo: un único agregado con conteos condicionales
+        buckets = self.get_price_buckets(request)
+        ranges = list(zip(buckets, buckets[1:] + [None]))
+        aggregates = {'total': Count('pk')}
+        for index, (value, label) in enumerate(STOCK_STATUS):
+            aggregates[f'stock_status_{index}'] = Count('pk', filter=Q(stock_status=value))
+        for index, (value, label) in enumerate(CURRENCY):
+            aggregates[f'currency_{index}'] = Count('pk', filter=Q(currency=value))
+        for index, (low, high) in enumerate(ranges):
+            price_filter = Q(price_1__gte=low) if high is None else Q(price_1__gte=low, price_1__lt=high)
+            aggregates[f'price_range_{index}'] = Count('pk', filter=price_filter)
+        totals = products.aggregate(**aggregates)
+
+        # Facetas abiertas: un GROUP BY por relación
+        brands = products.order_by().values('brand', 'brand__name').annotate(count=Count('pk')).order_by('-count', 'brand__name')
+        categories = (Product.categories.through.objects
+                      .filter(product__in=products.values('pk'))
+                      .values('category', 'category__name')
+                      .annotate(count=Count('product'))
+                      .order_by('-count', 'category__name'))
+
+        return Response({
+            'count': totals['total'],
+            'brands': [{'id': row['brand'], 'name': row['brand__name'], 'count': row['count']} for row in brands],
+            'categories': [
+                {'id': row['category'], 'name': row['category__name'], 'count': row['count']} for row in categories
+            ],
+            'stock_status': [
+                {'value': value, 'count': totals[f'stock_status_{index}']} for index, (value, label) in enumerate(STOCK_STATUS)
+            ],
+            'currency': [
+                {'value': value, 'count': totals[f'currency_{index}']} for index, (value, label) in enumerate(CURRENCY)
+            ],
+            'price': [
+                {'min': str(low), 'max': high if high is None else str(high), 'count': totals[f'price_range_{index}']}
+                for index, (low, high) in enumerate(ranges)
+            ],
+        })
+
+
+class ProductExportView(ProductView):
+    """
+    Exporta en streaming (CSV o NDJSON) todos los productos que cumplen los
+    mismos filtros y búsqueda de ProductView, sin paginar. Se comprime al
+    vuelo según Accept-Encoding. El formato lo indica la URL, no Accept
+    """
+    pagination_class = None
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get_queryset(self):
+        return Product.objects.filter(parent=None, virtual=False)
+
+    def perform_content_negotiation(self, request, force=False):
+        # La exportación no usa renderers (p. ej. Accept: text/csv daría 406);
+        # los errores se responden con el primero (JSON)
+        return super().perform_content_negotiation(request, force=True)
+
+    def list(self, request, *args, **kwargs):
+        export_format = kwargs['export_format']
+        exporter = ProductExporter(self.filter_queryset(self.get_queryset()), request=request)
+        rows = exporter.iter_csv() if export_format == 'csv' else exporter.iter_ndjson()
+        encoding = get_content_encoding(self, request)
+        if encoding is not None:
+            rows = compress_stream(rows, encoding)
+        response = StreamingHttpResponse(rows, content_type=self.content_types[export_format])
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+        response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+        return response
+
+
+class ProductSuggestView(APIView):
+    """
+    Autocompletado de productos por prefijo y similitud de trigramas
+    (índices GIN gin_trgm_ops sobre name y sku en PostgreSQL).
+    Parámetros: ?q=<texto>&limit=<n>&organization=<id>. Un limit mayor que
+    max_limit se reduce a max_limit.
+    """
+    default_limit = 10
+    max_limit = 20
+    min_length = 2
+    cache_timeout = 30
+
+    def get(self, request, format=None):
+        limit = get_limit_param(request, self.default_limit, self.max_limit)
+        organization = get_organization_param(request)
+        term = ' '.join(request.query_params.get('q', '').split())
+        if len(term) < self.min_length:
+            return Response([])
+
+        digest = hashlib.md5(term.lower().encode('utf-8')).hexdigest()
+        cache_key = f'product-suggest:{organization}:{limit}:{digest}:{request.get_host()}'
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = self.get_queryset(term, organization)[:limit]
+            data = ProductSuggestSerializer(queryset, many=True, context={'request': request}).data
+            cache.set(cache_key, data, self.cache_timeout)
+        return Response(data)
+
+    def get_queryset(self, term, organization):
+        queryset = Product.objects.filter(parent=None, virtual=False).only('id', 'name', 'sku', 'slug', 'image')
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+        prefix = Q(name__istartswith=term) | Q(sku__istartswith=term)
+        queryset = queryset.annotate(
+            is_prefix=Case(When(prefix, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        if connection.vendor == 'postgresql':
+            queryset = queryset.annotate(upper_name=Upper('name'), similarity=TrigramSimilarity('name', term))
+            return queryset.filter(prefix | Q(upper_name__trigram_similar=term)).order_by(
+                '-is_prefix', '-similarity', 'name')
+        return queryset.filter(prefix | Q(name__icontains=term)).order_by('-is_prefix', 'name')
+
+
+class ProductChangesView(APIView):
+    """
+    Feed de cambios de productos para sincronizar sistemas externos.
+    Devuelve en orden (modified, id) los productos creados, modificados o
+    eliminados después de `since`, incluidos los eliminados (lápidas con
+    removed=true y product=null), y el token `next` para la siguiente
+    llamada. Sin `since` se recorre el catálogo completo.
+    Parámetros: ?since=<token>&limit=<n>&organization=<id>. Un limit mayor
+    que max_limit se reduce a max_limit.
+    Usa el índice (organization, modified, id) de Product.
+    """
+    default_limit = 100
+    max_limit = 1000
+    # Los cambios más recientes que este margen aún no se entregan, para no
+    # saltar filas de transacciones que confirman con un `modified` anterior
+    settle_seconds = 2
+
+    def get(self, request, format=None):
+        since = self.decode_token(request.query_params.get('since'))
+        limit = get_limit_param(request, self.default_limit, self.max_limit)
+
+        queryset = Product.all_objects.filter(modified__lte=timezone.now() - timedelta(seconds=self.settle_seconds))
+        organization = get_organization_param(request)
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+        if since is not None:
+            modified, pk = since
+            queryset = queryset.filter(Q(modified__gt=modified) | Q(modified=modified, id__gt=pk))
+        changes = list(queryset.order_by('modified', 'id').only('id', 'modified', 'is_removed')[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        upserts = [product.pk for product in changes if not product.is_removed]
+        products = ProductSerializer.setup_eager_loading(Product.objects.filter(pk__in=upserts))
+        data = {
+            product['id']: product for product in
+            ProductSerializer(products, many=True, context={'request': request}).data
+        }
+        results = [{
+            'id': product.pk,
+            'modified': product.modified,
+            'removed': product.is_removed,
+            'product': data.get(product.pk),
+        } for product in changes]
+
+        last = (changes[-1].modified, changes[-1].pk) if changes else since
+        return Response({
+            'next': self.encode_token(last) if last else request.query_params.get('since'),
+            'has_more': has_more,
+            'results': results,
+        })
+
+    def encode_token(self, position):
+        modified, pk = position
+        raw = json.dumps({'m': modified.isoformat(), 'id': pk}, separators=(',', ':'))
+        return urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_token(self, token):
+        if not token:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            modified = parse_datetime(position['m'])
+            if modified is None:
+                raise ValueError
+            return modified, int(position['id'])
+        except Exception:
+            raise exceptions.ValidationError({'since': 'Invalid token'})
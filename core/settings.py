@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party apps
     'corsheaders',
@@ -114,6 +116,71 @@ if os.getenv('DOCKER_ENV') == 'true':
     }
 
 
+# Caché: Redis si REDIS_URL está definido, memoria local en otro caso
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'ms_catalogue',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ms_catalogue',
+        }
+    }
+
+# Segundos que se guardan las respuestas del catálogo (se invalidan por señales)
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', '300'))
+# Tamaño mínimo (bytes) para guardar en caché variantes comprimidas (gzip/br)
+CATALOGUE_COMPRESS_MIN_LENGTH = int(os.getenv('CATALOGUE_COMPRESS_MIN_LENGTH', '1024'))
+
+# Filas por lote al importar productos (ImportFile)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+# Filas por lote en el modo COPY (ImportFile.mode = 'copy', solo PostgreSQL)
+IMPORT_COPY_BATCH_SIZE = int(os.getenv('IMPORT_COPY_BATCH_SIZE', '50000'))
+# Segundos que dura el lock de una importación en curso (debe superar la
+# importación más larga); ver CELERY_BROKER_TRANSPORT_OPTIONS
+IMPORT_LOCK_TIMEOUT = int(os.getenv('IMPORT_LOCK_TIMEOUT', '21600'))
+
+# Imágenes del zip de importación: procesos (hilos en un worker daemon) para
+# decodificar/reducir, lado mayor máximo en píxeles, tamaño máximo por
+# archivo y archivos por lote
+IMPORT_IMAGE_WORKERS = int(os.getenv('IMPORT_IMAGE_WORKERS', str(os.cpu_count() or 1)))
+IMPORT_IMAGE_MAX_SIZE = int(os.getenv('IMPORT_IMAGE_MAX_SIZE', '1600'))
+IMPORT_IMAGE_MAX_BYTES = int(os.getenv('IMPORT_IMAGE_MAX_BYTES', str(50 * 1024 * 1024)))
+IMPORT_IMAGE_BATCH_SIZE = int(os.getenv('IMPORT_IMAGE_BATCH_SIZE', '200'))
+
+# Máximo de elementos por petición en /api/product_view/bulk/ (una transacción)
+PRODUCT_BULK_MAX_ITEMS = int(os.getenv('PRODUCT_BULK_MAX_ITEMS', '1000'))
+# Máximo de claves (ids + skus + slugs) por petición en /api/product_view/batch/
+PRODUCT_BATCH_MAX_KEYS = int(os.getenv('PRODUCT_BATCH_MAX_KEYS', '100'))
+
+# Productos por bloque (iterator + prefetch) al exportar el catálogo
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Celery: las importaciones se procesan en un worker. Sin broker configurado
+# las tareas se ejecutan en el mismo proceso (modo eager, útil en desarrollo y tests)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', str(not CELERY_BROKER_URL)).lower() in ('1', 'true', 'yes')
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Con acks_late, Redis vuelve a entregar una tarea no confirmada pasado el
+# visibility_timeout (1 hora por defecto) aunque siga en ejecución. Se deja
+# por encima de IMPORT_LOCK_TIMEOUT para que una importación larga no se repita
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', str(IMPORT_LOCK_TIMEOUT * 2))),
+}
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -222,9 +289,23 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack (application/msgpack) para servicios internos si msgpack está instalado
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'api.renderers.MessagePackParser')
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200",  # Angular dev server